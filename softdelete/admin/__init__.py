@@ -1,5 +1,7 @@
 from softdelete.admin.admin import *
 from softdelete.admin.forms import *
+from softdelete.admin.filterspecs import DeletedFilterSpec
 
 __all__ = ['SoftDeleteObjectAdmin', 'SoftDeleteObjectInline',
-           'SoftDeleteObjectAdminForm', ]
+           'SoftDeleteObjectAdminForm', 'DeletedFilterSpec',
+           'ApproximateCountPaginator', 'SoftDeleteInlineFormSet', ]
@@ -1,9 +1,64 @@
+from django.conf import settings
 from django.http import HttpResponseRedirect
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render_to_response
+from django.template import RequestContext
+from django.utils.encoding import force_unicode
+from softdelete.cascade import SoftDeleteCascade
+from softdelete.plan import estimate_count
 from softdelete.models import *
 from softdelete.admin.forms import *
 
+class SoftDeleteInlineFormSet(BaseInlineFormSet):
+    """Inline formset showing at most ``max_rows`` children, and the live
+    ones only unless ``show_deleted`` is set.
+    """
+    max_rows = None
+    show_deleted = False
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            qs = super(SoftDeleteInlineFormSet, self).get_queryset()
+            self._truncated = False
+            if self.max_rows is not None:
+                # One more row tells whether any is left out, in the same
+                # query.
+                rows = list(qs[:self.max_rows + 1])
+                self._truncated = len(rows) > self.max_rows
+                qs = qs[:self.max_rows]
+                qs._result_cache = rows[:self.max_rows]
+            self._queryset = qs
+        return self._queryset
+
+    def truncated(self):
+        self.get_queryset()
+        return self._truncated
+
+    def deleted_count(self):
+        """The number of deleted children left out, with one COUNT."""
+        if self.show_deleted or self.instance.pk is None:
+            return 0
+        if not hasattr(self, '_deleted_count'):
+            self._deleted_count = self.model._base_manager.using(
+                self.instance._state.db).filter(
+                deleted_at__isnull=False,
+                **{self.fk.name: self.instance}).count()
+        return self._deleted_count
+
+
 class SoftDeleteObjectInline(admin.TabularInline):
+    formset = SoftDeleteInlineFormSet
+    template = 'admin/softdelete/edit_inline/tabular.html'
+    # Lists deleted children too; otherwise only their number is shown.
+    show_deleted = False
+    # Limits the children listed, whatever their number.
+    max_rows = None
+
     class Meta:
         exclude = ('deleted_at',)
 
@@ -13,35 +68,155 @@ class SoftDeleteObjectInline(admin.TabularInline):
             self.extra = 0
             self.max_num = 0
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super(SoftDeleteObjectInline, self).get_formset(
+            request, obj, **kwargs)
+        formset.max_rows = self.max_rows
+        formset.show_deleted = self.show_deleted
+        return formset
+
     def queryset(self, request):
-        qs = self.model._default_manager.all_with_deleted()
+        if self.show_deleted:
+            qs = self.model._default_manager.all_with_deleted()
+        else:
+            qs = self.model._default_manager.all()
         ordering = self.ordering or ()
         if ordering:
             qs = qs.order_by(*ordering)
         return qs
 
+class ApproximateCountPaginator(Paginator):
+    """Counts pages with the planner's row estimate instead of a
+    ``COUNT(*)`` once the estimate exceeds
+    ``SOFTDELETE_ADMIN_APPROXIMATE_COUNT`` rows (PostgreSQL only).
+    """
+    def _get_count(self):
+        if self._count is None:
+            self._count = approximate_count(self.object_list)
+        return self._count
+    count = property(_get_count)
+
+
+def approximate_count(queryset):
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate > getattr(
+            settings, 'SOFTDELETE_ADMIN_APPROXIMATE_COUNT', 100000):
+        return estimate
+    return queryset.count()
+
+
+class _ApproximateCount(object):
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def count(self):
+        return approximate_count(self.queryset)
+
+
+class SoftDeleteChangeList(ChangeList):
+    def get_results(self, request):
+        if not issubclass(self.model_admin.paginator,
+                          ApproximateCountPaginator):
+            return super(SoftDeleteChangeList, self).get_results(request)
+        # The unfiltered total is only used for "N total", estimate it too.
+        root_query_set = self.root_query_set
+        self.root_query_set = _ApproximateCount(root_query_set)
+        try:
+            super(SoftDeleteChangeList, self).get_results(request)
+        finally:
+            self.root_query_set = root_query_set
+
+
 class SoftDeleteObjectAdmin(admin.ModelAdmin):
     form = SoftDeleteObjectAdminForm
     actions = ['delete_selected', 'soft_undelete']
+    list_filter = ('deleted_at',)
+    list_select_related = True
 
     def delete_selected(self, request, queryset):
-        queryset.delete()
+        return self.bulk_action(request, queryset, 'delete_selected',
+                                deleted=True)
     delete_selected.short_description = 'Soft delete selected objects'
 
     def soft_undelete(self, request, queryset):
-        queryset.undelete()
+        return self.bulk_action(request, queryset, 'soft_undelete',
+                                deleted=False)
     soft_undelete.short_description = 'Undelete selected objects'
 
+    def bulk_action(self, request, queryset, action, deleted):
+        """Soft-deletes or undeletes the selection with set-based updates,
+        after a confirmation page listing how many rows of each model are
+        affected.  Selections larger than
+        ``SOFTDELETE_ADMIN_BACKGROUND_THRESHOLD`` rows get their cascade
+        queued as a background job.
+        """
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        using = queryset.db
+        opts = self.model._meta
+        verb = deleted and 'soft-delete' or 'undelete'
+        threshold = getattr(settings, 'SOFTDELETE_ADMIN_BACKGROUND_THRESHOLD',
+                            1000)
+        if request.POST.get('post'):
+            selected = queryset.filter(deleted_at__isnull=deleted).count()
+            background = selected > threshold
+            if deleted:
+                queryset.soft_delete(using=using, bulk=True,
+                                     background=background)
+            else:
+                queryset.undelete(using=using, bulk=True,
+                                  background=background)
+            self.message_user(request, '%s %d %s%s.' % (
+                deleted and 'Soft-deleted' or 'Undeleted', selected,
+                force_unicode(opts.verbose_name_plural),
+                background and ' (related rows in the background)' or ''))
+            return None
+        cascade = SoftDeleteCascade(using=using)
+        if deleted:
+            totals, counts = {}, cascade.count(queryset, deleted=True)
+        else:
+            # Undelete restores the changesets of the selected rows, and
+            # walks the relations of those none of them covers.
+            pks = list(queryset.filter(deleted_at__isnull=False).values_list(
+                'pk', flat=True))
+            totals, uncovered = ChangeSet.objects.db_manager(
+                using).restore_counts(self.model, pks)
+            counts = uncovered and cascade.count(
+                queryset.filter(pk__in=uncovered), deleted=False) or []
+        for depth, model, rows in counts:
+            totals[model] = totals.get(model, 0) + rows
+        context = {
+            'title': '%s multiple objects' % verb.capitalize(),
+            'verb': verb,
+            'action': action,
+            'objects_name': force_unicode(opts.verbose_name_plural),
+            'counts': sorted([(force_unicode(m._meta.verbose_name_plural), r)
+                              for m, r in totals.items()]),
+            'background': totals.get(self.model, 0) > threshold,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across') == '1',
+            'opts': opts,
+            'app_label': opts.app_label,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return render_to_response(
+            'admin/softdelete/bulk_confirmation.html', context,
+            context_instance=RequestContext(request))
+
     def response_change(self, request, obj, *args, **kwargs):
         if request.POST.has_key('undelete'):
             return HttpResponseRedirect('../')
         return super(SoftDeleteObjectAdmin, self).response_change(request, obj, *args, **kwargs)
 
+    def get_changelist(self, request, **kwargs):
+        return SoftDeleteChangeList
+
     def queryset(self, request):
-        try:
-            qs = self.model._default_manager.all_with_deleted()
-        except Exception:
-            qs = self.model._default_manager.all()
+        manager = self.model._default_manager
+        if hasattr(manager, 'all_with_deleted'):
+            qs = manager.all_with_deleted()
+        else:
+            qs = manager.all()
 
         ordering = self.ordering or ()
         if ordering:
@@ -0,0 +1,37 @@
+from django.contrib.admin.filterspecs import FilterSpec
+from softdelete.models import SoftDeleteObject
+
+
+class DeletedFilterSpec(FilterSpec):
+    """Filters the changelist of a soft-delete model on its live or deleted
+    rows, with a ``deleted_at__isnull`` lookup the live-rows indexes can
+    serve.  Used for ``deleted_at`` in ``list_filter``.
+    """
+    def __init__(self, f, request, params, model, model_admin,
+                 field_path=None):
+        super(DeletedFilterSpec, self).__init__(f, request, params, model,
+                                                model_admin,
+                                                field_path=field_path)
+        self.lookup_kwarg = '%s__isnull' % self.field_path
+        self.lookup_val = request.GET.get(self.lookup_kwarg, None)
+
+    def title(self):
+        return 'status'
+
+    def choices(self, cl):
+        for display, value in (('All', None), ('Live', 'True'),
+                               ('Deleted', 'False')):
+            yield {'selected': self.lookup_val == value,
+                   'query_string': cl.get_query_string(
+                                   {self.lookup_kwarg: value},
+                                   [self.lookup_kwarg]),
+                   'display': display}
+
+
+def is_deleted_at(f):
+    return getattr(f, 'name', None) == 'deleted_at' and \
+           issubclass(getattr(f, 'model', object), SoftDeleteObject)
+
+# FilterSpec.create uses the first matching spec, and the built-in date
+# spec would match deleted_at.
+FilterSpec.filter_specs.insert(0, (is_deleted_at, DeletedFilterSpec))
@@ -0,0 +1,208 @@
+"""Archive tables keeping the soft-deleted rows out of the live table.
+
+A model opts in with ``soft_delete_archive = True``::
+
+    class LogEntry(SoftDeleteObject):
+        soft_delete_archive = True
+
+Its table then holds the live rows only.  Soft-deleting rows moves them,
+with one ``INSERT ... SELECT`` and one ``DELETE`` per chunk, to the
+``<db_table>_archive`` table, and undeleting moves them back.
+``soft_deleted_set()`` reads the archive table and ``all_with_deleted()``
+(hence ``get``) the ``<db_table>_all`` view, the ``UNION ALL`` of both;
+querysets over the archive or the view are read-only, but for ``delete``,
+which removes archived rows from the archive table.
+
+Rows moved to the archive cannot stay the target of foreign keys, so only
+models that no other model references can be archived.  Their keys must
+not be handed out again once moved: on SQLite ``create_archive`` rebuilds
+the table with ``AUTOINCREMENT``, and MySQL before 8.0, whose InnoDB
+counters restart from the largest key, is refused.  ``syncdb`` creates
+the archive table and view; existing tables can get them from a migration
+with ``create_archive``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.color import no_style
+from django.db import connections, models, DEFAULT_DB_ALIAS
+from django.db.backends.util import truncate_name
+from django.db.models.signals import pre_delete, post_delete
+
+
+def is_archived(model):
+    return getattr(model, 'soft_delete_archive', False)
+
+
+def archive_table(model):
+    return truncate_name('%s_archive' % model._meta.db_table,
+                         connections[DEFAULT_DB_ALIAS].ops.max_name_length())
+
+
+def all_view(model):
+    return truncate_name('%s_all' % model._meta.db_table,
+                         connections[DEFAULT_DB_ALIAS].ops.max_name_length())
+
+
+def use_table(qs, table):
+    """Returns a copy of ``qs`` reading ``table``, which has the columns of
+    the table of its model, instead of that table.
+    """
+    qs = qs._clone()
+    alias = qs.query.get_initial_alias()
+    qs.query.alias_map[alias] = (table,) + tuple(qs.query.alias_map[alias][1:])
+    return qs
+
+
+def base_queryset(model, using, deleted=False):
+    """All the rows of ``model`` on ``using``, or with ``deleted`` all the
+    soft-deleted rows, wherever they are stored.
+    """
+    qs = model._base_manager.using(using).all()
+    if deleted and is_archived(model):
+        qs = use_table(qs, archive_table(model))
+    return qs
+
+
+def check_archive(model):
+    opts = model._meta
+    if opts.parents:
+        raise ImproperlyConfigured(
+            "%s inherits from another model and cannot be archived." %
+            opts.object_name)
+    referencing = [related.model._meta.object_name for related in
+                   opts.get_all_related_objects(include_hidden=True)]
+    if referencing:
+        raise ImproperlyConfigured(
+            "%s is referenced by %s and cannot be archived." % (
+                opts.object_name, ', '.join(referencing)))
+
+
+def check_keys(model, connection):
+    """Makes sure the table of ``model`` never reuses the keys of rows
+    moved to the archive.
+    """
+    if connection.vendor == 'mysql' and \
+           connection.get_server_version() < (8, 0):
+        raise ImproperlyConfigured(
+            "%s cannot be archived: MySQL before 8.0 reuses the keys of "
+            "deleted rows." % model._meta.object_name)
+    if connection.vendor != 'sqlite' or \
+           not isinstance(model._meta.pk, models.AutoField):
+        return
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    cursor = connection.cursor()
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND "
+                   "name = %s", [table])
+    if 'AUTOINCREMENT' in cursor.fetchone()[0].upper():
+        return
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND "
+                   "tbl_name = %s AND sql IS NOT NULL", [table])
+    indexes = [row[0] for row in cursor.fetchall()]
+    # Without AUTOINCREMENT, SQLite gives new rows the largest key + 1.
+    statements, references = connection.creation.sql_create_model(
+        model, no_style(), set())
+    pk = '%s integer NOT NULL PRIMARY KEY' % qn(model._meta.pk.column)
+    rebuilt = qn('%s__rebuilt' % table)
+    columns = _columns(model, connection)
+    cursor.execute(statements[0].replace(qn(table), rebuilt, 1).replace(
+        pk, pk + ' AUTOINCREMENT', 1))
+    cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (
+        rebuilt, columns, columns, qn(table)))
+    cursor.execute('DROP TABLE %s' % qn(table))
+    cursor.execute('ALTER TABLE %s RENAME TO %s' % (rebuilt, qn(table)))
+    for sql in indexes:
+        cursor.execute(sql)
+
+
+def _columns(model, connection):
+    qn = connection.ops.quote_name
+    return ', '.join([qn(f.column) for f in model._meta.local_fields])
+
+
+def create_archive(model, using=DEFAULT_DB_ALIAS):
+    """Creates the archive table and the view of ``model`` unless they
+    exist.
+    """
+    check_archive(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table, archive = model._meta.db_table, archive_table(model)
+    if archive in connection.introspection.table_names():
+        return
+    check_keys(model, connection)
+    columns = _columns(model, connection)
+    cursor = connection.cursor()
+    # The columns are declared as in the table of the model, so that they
+    # read back as the same types; the foreign keys are not enforced.
+    statements, references = connection.creation.sql_create_model(
+        model, no_style(), set())
+    for statement in statements:
+        cursor.execute(statement.replace(qn(table), qn(archive), 1))
+    cursor.execute('CREATE VIEW %s AS SELECT %s FROM %s UNION ALL '
+                   'SELECT %s FROM %s' % (qn(all_view(model)), columns,
+                                          qn(table), columns, qn(archive)))
+
+
+def move(model, pks, using, deleted_at):
+    """Sets ``deleted_at`` on the rows ``pks`` of ``model`` and moves them
+    to the archive table, or with a ``deleted_at`` of None, back from it.
+    Returns the number of rows moved.
+    """
+    if not pks:
+        return 0
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    source, target = model._meta.db_table, archive_table(model)
+    if deleted_at is None:
+        source, target = target, source
+    where = '%s IN (%s)' % (qn(model._meta.pk.column),
+                            ', '.join(['%s'] * len(pks)))
+    columns = _columns(model, connection)
+    cursor = connection.cursor()
+    cursor.execute('UPDATE %s SET %s = %%s WHERE %s' % (
+        qn(source), qn('deleted_at'), where),
+        [connection.ops.value_to_db_datetime(deleted_at)] + list(pks))
+    rows = cursor.rowcount
+    if rows:
+        cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s WHERE %s' % (
+            qn(target), columns, columns, qn(source), where), list(pks))
+        cursor.execute('DELETE FROM %s WHERE %s' % (qn(source), where),
+                       list(pks))
+    return rows
+
+
+def save_archived(obj, using):
+    """Saves the fields of ``obj``, a soft-deleted object of an archived
+    model, to its archive row.  Returns whether there was one.
+    """
+    model = obj.__class__
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    fields = [f for f in model._meta.local_fields if not f.primary_key]
+    cursor = connection.cursor()
+    cursor.execute('UPDATE %s SET %s WHERE %s = %%s' % (
+        qn(archive_table(model)),
+        ', '.join(['%s = %%s' % qn(f.column) for f in fields]),
+        qn(model._meta.pk.column)),
+        [f.get_db_prep_save(f.pre_save(obj, False), connection=connection)
+         for f in fields] + [obj.pk])
+    return bool(cursor.rowcount)
+
+
+def delete_archived(objs, using):
+    """Hard-deletes ``objs``, soft-deleted objects of an archived model,
+    from its archive table, sending ``pre_delete`` and ``post_delete``.
+    """
+    if not objs:
+        return
+    model = objs[0].__class__
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    for obj in objs:
+        pre_delete.send(sender=model, instance=obj, using=using)
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+        qn(archive_table(model)), qn(model._meta.pk.column),
+        ', '.join(['%s'] * len(objs))), [obj.pk for obj in objs])
+    for obj in objs:
+        post_delete.send(sender=model, instance=obj, using=using)
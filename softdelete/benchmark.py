@@ -0,0 +1,167 @@
+"""Benchmarks of soft-delete cascades on generated graphs.
+
+The graphs are built from the models of ``softdelete.test_softdelete_app``:
+every root ``TestModelOne`` gets ``fan_out`` ``TestModelTwo`` children
+(foreign key), ``fan_out`` ``TestModelThree`` linked through
+``TestModelThrough`` (many-to-many) and a ``TestModelTree`` of ``depth``
+levels of ``fan_out`` children each.
+
+Each scenario runs on a fresh graph and reports its wall time, number of
+queries, number of rows soft-deleted, undeleted or removed, and growth of
+the peak resident memory of the process.  ``check`` compares results with
+regression thresholds; ``manage.py softdelete_benchmark`` runs the whole
+suite on a throwaway test database.
+"""
+import math
+import resource
+import time
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test.client import RequestFactory
+from softdelete.models import CascadeJob, ChangeSet, SoftDeleteRecord
+
+SCENARIOS = ('cascade', 'queryset', 'undelete', 'admin')
+
+# Queries allowed per scenario: a fixed part, a part per tree level and a
+# part per chunk of rows (SOFTDELETE_CHUNK_SIZE) touched.
+THRESHOLDS = {
+    'cascade': (16, 3, 3),
+    'queryset': (13, 3, 3),
+    'undelete': (12, 0, 1),
+    'admin': (18, 3, 3),
+}
+
+
+def _models():
+    from softdelete.test_softdelete_app import models
+    return (models.TestModelTree, models.TestModelThrough,
+            models.TestModelTwo, models.TestModelThree, models.TestModelOne)
+
+
+class Result(object):
+    def __init__(self, scenario, seconds, queries, rows, peak_kb):
+        self.scenario = scenario
+        self.seconds = seconds
+        self.queries = queries
+        self.rows = rows
+        self.peak_kb = peak_kb
+
+    def __repr__(self):
+        return '<Result %s: %.3fs, %d queries, %d rows, %d KB>' % (
+            self.scenario, self.seconds, self.queries, self.rows,
+            self.peak_kb)
+
+
+class Benchmark(object):
+    def __init__(self, depth=3, fan_out=10, roots=1, using=DEFAULT_DB_ALIAS):
+        self.depth = depth
+        self.fan_out = fan_out
+        self.roots = roots
+        self.using = using
+
+    def build(self):
+        """Creates the graph and returns its root objects."""
+        (TestModelTree, TestModelThrough, TestModelTwo, TestModelThree,
+         TestModelOne) = _models()
+        roots = []
+        with transaction.commit_on_success(using=self.using):
+            for i in xrange(self.roots):
+                root = TestModelOne.objects.using(self.using).create()
+                roots.append(root)
+                for x in xrange(self.fan_out):
+                    TestModelTwo.objects.using(self.using).create(
+                        extra_int=x, tmo=root)
+                    tmo3 = TestModelThree.objects.using(self.using).create()
+                    TestModelThrough.objects.using(self.using).create(
+                        tmo1=root, tmo3=tmo3)
+                level = [TestModelTree.objects.using(self.using).create(
+                    tmo=root) for x in xrange(self.fan_out)]
+                for d in xrange(1, self.depth):
+                    level = [TestModelTree.objects.using(self.using).create(
+                        parent=parent) for parent in level
+                             for x in xrange(self.fan_out)]
+        return roots
+
+    def clear(self):
+        connection = connections[self.using]
+        cursor = connection.cursor()
+        for model in _models() + (SoftDeleteRecord, ChangeSet, CascadeJob):
+            cursor.execute('DELETE FROM %s' % connection.ops.quote_name(
+                model._meta.db_table))
+        transaction.commit_unless_managed(using=self.using)
+
+    def live_rows(self):
+        return dict((model, model._base_manager.using(self.using).filter(
+            deleted_at__isnull=True).count()) for model in _models())
+
+    def measure(self, scenario, func):
+        connection = connections[self.using]
+        before = self.live_rows()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        connection.queries = []
+        start = time.time()
+        try:
+            func()
+        finally:
+            seconds = time.time() - start
+            queries = len(connection.queries)
+            connection.use_debug_cursor = debug_cursor
+        after = self.live_rows()
+        rows = sum([abs(after[m] - before[m]) for m in after])
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak
+        return Result(scenario, seconds, queries, rows, peak_kb)
+
+    def run(self, scenarios=SCENARIOS):
+        results = []
+        for scenario in scenarios:
+            self.clear()
+            roots = self.build()
+            func = getattr(self, 'run_%s' % scenario)(roots)
+            results.append(self.measure(scenario, func))
+        self.clear()
+        return results
+
+    def run_cascade(self, roots):
+        return lambda: roots[0].soft_delete(using=self.using)
+
+    def run_queryset(self, roots):
+        model = roots[0].__class__
+        return lambda: model.objects.using(self.using).all().soft_delete(
+            using=self.using, bulk=True)
+
+    def run_undelete(self, roots):
+        roots[0].soft_delete(using=self.using)
+        return lambda: roots[0].undelete(using=self.using)
+
+    def run_admin(self, roots):
+        model = roots[0].__class__
+        model_admin = admin.site._registry[model]
+        request = RequestFactory().post('/', {'post': 'yes'})
+        request.user = User(is_active=True, is_superuser=True)
+        request._messages = CookieStorage(request)
+        queryset = model_admin.queryset(request).using(self.using)
+        return lambda: model_admin.delete_selected(request, queryset)
+
+    def check(self, results, max_seconds=None):
+        """Returns the descriptions of the results exceeding the query
+        thresholds, or ``max_seconds``.
+        """
+        chunk_size = getattr(settings, 'SOFTDELETE_CHUNK_SIZE', 500)
+        failures = []
+        for result in results:
+            if result.scenario in THRESHOLDS:
+                base, per_level, per_chunk = THRESHOLDS[result.scenario]
+                chunks = int(math.ceil(result.rows / float(chunk_size)))
+                limit = base + per_level * self.depth + per_chunk * chunks
+                if result.queries > limit:
+                    failures.append('%s: %d queries, expected at most %d' % (
+                        result.scenario, result.queries, limit))
+            if max_seconds is not None and result.seconds > max_seconds:
+                failures.append('%s: %.3fs, expected at most %.3fs' % (
+                    result.scenario, result.seconds, max_seconds))
+        return failures
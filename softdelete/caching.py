@@ -0,0 +1,150 @@
+"""Read-through cache of ``SoftDeleteManager.get`` by primary key.
+
+A model opts in with ``soft_delete_cache = True``; ``Model.objects.get(pk=
+...)`` then serves its objects, deleted or not, from a local LRU of
+``SOFTDELETE_CACHE_SIZE`` entries (1000 by default) kept
+``SOFTDELETE_CACHE_LOCAL_TIMEOUT`` seconds (1 by default), backed by the
+Django cache named by ``SOFTDELETE_CACHE_BACKEND``, if any, for
+``SOFTDELETE_CACHE_TIMEOUT`` seconds (300 by default).  Entries are keyed
+by model and primary key, whatever the database alias they were read
+through, so that writes to a primary invalidate the reads routed to its
+replicas.
+
+Entries are invalidated by ``save``, ``delete``, and the keys every
+soft-delete or undelete (cascades, changeset restores and purges
+included) marks, once more after their transaction commits.  The local
+LRU of other processes only learns about changes when its entries
+expire; ``QuerySet.update`` calls outside softdelete are not seen.
+"""
+from contextlib import contextmanager
+from collections import OrderedDict
+import cPickle as pickle
+import threading
+import time
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models.signals import post_delete, post_save
+
+
+def is_cached(model):
+    return getattr(model, 'soft_delete_cache', False)
+
+
+class SoftDeleteCache(object):
+    def __init__(self, size=1000, local_timeout=1, backend=None, timeout=300):
+        self.size = size
+        self.local_timeout = local_timeout
+        self.backend = backend
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, model, pk):
+        # Not per database alias: reads routed to a replica must be
+        # invalidated by the writes made to its primary.
+        opts = model._meta
+        return 'softdelete:%s.%s:%s' % (opts.app_label, opts.object_name, pk)
+
+    def get(self, model, pk):
+        """Returns the cached object, or None."""
+        key = self.key(model, pk)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self.entries[key] = entry
+                return pickle.loads(entry[1])
+        if self.backend is not None:
+            data = self.backend.get(key)
+            if data is not None:
+                self._store(key, data)
+                return pickle.loads(data)
+        return None
+
+    def set(self, model, obj):
+        key = self.key(model, obj.pk)
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        self._store(key, data)
+        if self.backend is not None:
+            self.backend.set(key, data, self.timeout)
+
+    def _store(self, key, data):
+        if not self.size or not self.local_timeout:
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.local_timeout, data)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, model, pks):
+        keys = [self.key(model, pk) for pk in pks]
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete_many(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = []
+_local = threading.local()
+
+
+def get_soft_delete_cache():
+    if not _cache:
+        backend = getattr(settings, 'SOFTDELETE_CACHE_BACKEND', None)
+        _cache.append(SoftDeleteCache(
+            size=getattr(settings, 'SOFTDELETE_CACHE_SIZE', 1000),
+            local_timeout=getattr(settings, 'SOFTDELETE_CACHE_LOCAL_TIMEOUT',
+                                  1),
+            backend=backend and get_cache(backend) or None,
+            timeout=getattr(settings, 'SOFTDELETE_CACHE_TIMEOUT', 300)))
+    return _cache[0]
+
+
+def reset_soft_delete_cache():
+    """Rebuilds the cache from the settings on next use."""
+    del _cache[:]
+
+
+def invalidate(model, pks):
+    """Drops the cached objects ``pks`` of ``model``, now and, within a
+    ``deferred_invalidation`` block, once more when it exits.
+    """
+    if not is_cached(model) or not pks:
+        return
+    get_soft_delete_cache().delete(model, pks)
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.append((model, list(pks)))
+
+
+@contextmanager
+def deferred_invalidation():
+    """Repeats the invalidations of the block after it, i.e. after the
+    commit of the transaction it wraps: lookups made meanwhile from other
+    transactions may have cached the rows as they were before.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = []
+    try:
+        yield
+    finally:
+        pending, _local.pending = _local.pending, None
+        for model, pks in pending:
+            get_soft_delete_cache().delete(model, pks)
+
+
+def invalidate_instance(sender, instance, using=None, **kwargs):
+    if is_cached(sender):
+        invalidate(sender, [instance.pk])
+
+post_save.connect(invalidate_instance,
+                  dispatch_uid='softdelete.caching.invalidate_instance')
+post_delete.connect(invalidate_instance,
+                    dispatch_uid='softdelete.caching.invalidate_instance')
@@ -0,0 +1,522 @@
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.signals import class_prepared
+import logging
+from softdelete.archive import base_queryset, is_archived, move
+from softdelete.caching import deferred_invalidation, invalidate
+from softdelete.counters import is_counted, parent_counts, state_changed
+from softdelete.instrumentation import adopt, count, current
+from softdelete.signals import pre_soft_delete, pre_undelete, \
+     post_soft_delete, post_undelete, pre_bulk_soft_delete, \
+     post_bulk_soft_delete, pre_bulk_undelete, post_bulk_undelete
+
+
+def chunked(seq, size):
+    seq = list(seq)
+    for i in xrange(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+@contextmanager
+def cascade_transaction(using):
+    """Runs the block in a transaction on ``using``, joining the current
+    one if transaction management is already active.
+    """
+    if transaction.is_managed(using=using):
+        yield
+    else:
+        with deferred_invalidation():
+            with transaction.commit_on_success(using=using):
+                yield
+
+
+@contextmanager
+def cascade_transactions(aliases):
+    """Runs the block in one transaction per database alias.  They are
+    committed one after the other, innermost first: there is no two-phase
+    commit across databases.
+    """
+    if not aliases:
+        yield
+        return
+    with cascade_transaction(aliases[0]):
+        with cascade_transactions(aliases[1:]):
+            yield
+
+
+def db_for_model(model, default):
+    """Returns the alias the rows of ``model`` are written to by a cascade
+    started on ``default``: the choice of the first database router with
+    an opinion, ``default`` otherwise.  (``router.db_for_write`` would fall
+    back to the ``'default'`` alias instead.)
+    """
+    for r in router.routers:
+        try:
+            method = r.db_for_write
+        except AttributeError:
+            continue
+        alias = method(model)
+        if alias:
+            return alias
+    return default
+
+
+def cascade_aliases(model, using):
+    """Returns the aliases a cascade from ``model`` on ``using`` writes
+    to, ``using`` first.
+    """
+    aliases = [using]
+    for related in cascade_plan(model).reachable_models()[1:]:
+        alias = db_for_model(related, using)
+        if alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+
+class CascadeRelation(object):
+    """A reverse relation from a soft-deletable model that the cascade
+    follows.  ``lookup`` filters ``model`` by a list of primary keys of the
+    parent model.
+    """
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        if field.rel.get_related_field().primary_key:
+            self.lookup = '%s__in' % field.name
+        else:
+            self.lookup = '%s__pk__in' % field.name
+
+
+def has_integer_pk(model):
+    field = model._meta.pk
+    while field.rel:
+        field = field.rel.get_related_field()
+    return isinstance(field, (models.AutoField, models.IntegerField))
+
+
+class CascadePlan(object):
+    """The soft-deletable reverse relations of a model, computed once from
+    its ``_meta`` and reused by every cascade.
+    """
+    def __init__(self, model):
+        from softdelete.models import SoftDeleteObject
+        self.model = model
+        self._tracks_changesets = None
+        self._cycles = None
+        opts = model._meta
+        self.relations = []
+        for related in opts.get_all_related_objects():
+            if not issubclass(related.model, SoftDeleteObject):
+                continue
+            if related.field.rel.parent_link:
+                continue
+            self.relations.append(CascadeRelation(related.model,
+                                                  related.field))
+
+    def reachable_models(self):
+        """Returns the models a cascade from ``self.model`` can reach,
+        including ``self.model`` itself.
+        """
+        seen = [self.model]
+        for model in seen:
+            for relation in cascade_plan(model).relations:
+                if relation.model not in seen:
+                    seen.append(relation.model)
+        return seen
+
+    def cycles(self):
+        """Returns the models reachable from ``self.model`` that can reach
+        themselves again through their relations (e.g. a tree).
+        """
+        if self._cycles is None:
+            self._cycles = set()
+            for model in self.reachable_models():
+                for relation in cascade_plan(model).relations:
+                    if model in cascade_plan(
+                            relation.model).reachable_models():
+                        self._cycles.add(model)
+        return self._cycles
+
+    def shared_models(self):
+        """Returns the models reachable from ``self.model`` through more
+        than one relation (diamonds), whose rows a cascade may reach
+        several times.
+        """
+        incoming = {}
+        for model in self.reachable_models():
+            for relation in cascade_plan(model).relations:
+                incoming[relation.model] = incoming.get(relation.model, 0) + 1
+        return set([m for m, n in incoming.items() if n > 1])
+
+    def tracks_changesets(self):
+        """Changesets pack integer primary keys, so a cascade is only
+        recorded when every model it can reach has one.
+        """
+        if self._tracks_changesets is None:
+            self._tracks_changesets = all(
+                has_integer_pk(m) for m in self.reachable_models())
+        return self._tracks_changesets
+
+
+_plans = {}
+
+
+def cascade_plan(model):
+    """Returns the cached ``CascadePlan`` of ``model``.
+
+    Reverse relations are only known once the related models are loaded,
+    so plans are built on first use; the cache is emptied whenever a model
+    class is prepared.
+    """
+    try:
+        return _plans[model]
+    except KeyError:
+        plan = _plans[model] = CascadePlan(model)
+        return plan
+
+
+def clear_cascade_plans(**kwargs):
+    _plans.clear()
+class_prepared.connect(clear_cascade_plans)
+
+
+class SoftDeleteCascade(object):
+    """Propagates a soft-delete (or an undelete) through reverse relations.
+
+    Instead of loading and saving every descendant, the cascade works on
+    sets of primary keys: for each level of the relation graph it collects
+    the keys of the affected children with one query per relation, then
+    marks them with one ``UPDATE`` per model (split in chunks of
+    ``chunk_size`` keys).  The whole cascade runs in a single transaction.
+
+    When a ``changeset`` is given, every chunk of soft-deleted keys is
+    recorded in it so that the exact same rows can be restored later.
+
+    The rows of the starting model are marked on ``using``, those of the
+    related models on the alias picked by the database routers (see
+    ``db_for_model``); each level is processed grouped by alias, within
+    one transaction per alias.
+
+    Every set of keys marked for a model is announced by the
+    ``pre_bulk_*``/``post_bulk_*`` signals.  The per-instance signals,
+    which load every marked row, are only sent with ``send_signals``.
+    Signals nobody is connected to are not sent at all.
+    """
+    def __init__(self, using='default', chunk_size=None, send_signals=True,
+                 changeset=None):
+        self.using = using
+        self.changeset = changeset
+        self.chunk_size = chunk_size or getattr(settings,
+                                                'SOFTDELETE_CHUNK_SIZE', 500)
+        self.send_signals = send_signals
+        self.dbs = {}
+        # Keys already collected, per model: rows reached again through
+        # another path (a diamond) or a cycle are not processed twice.
+        self.visited = {}
+
+    def db_for(self, model):
+        if model not in self.dbs:
+            self.dbs[model] = db_for_model(model, self.using)
+        return self.dbs[model]
+
+    def transaction(self, model=None):
+        """Opens a transaction on ``using`` and, given the model the
+        cascade starts from, on every alias it writes to.
+        """
+        if model is None:
+            return cascade_transaction(self.using)
+        self.dbs[model] = self.using
+        return cascade_transactions(cascade_aliases(model, self.using))
+
+    def soft_delete(self, model, pks, deleted_at=None, include_root=False,
+                    related=True):
+        if deleted_at is None:
+            deleted_at = datetime.today()
+        self._run(model, pks, deleted_at, include_root, related)
+
+    def undelete(self, model, pks, include_root=False, related=True):
+        self._run(model, pks, None, include_root, related)
+
+    def relations(self, model):
+        return cascade_plan(model).relations
+
+    def count(self, queryset, deleted=True, max_depth=None, counter=None):
+        """Returns ``(depth, model, rows)`` for the rows of ``queryset``
+        that a soft-delete (or, with ``deleted=False``, an undelete) would
+        mark, and for the rows its cascade would reach.
+
+        No key is loaded: every level filters the next one through nested
+        subqueries, with one ``COUNT`` query per model and level (or one
+        call to ``counter(queryset)`` instead).  Rows reachable through
+        several paths may be counted more than once.  Models on a cycle of
+        relations are counted down to ``SOFTDELETE_COUNT_MAX_DEPTH`` levels
+        (8 by default) at most, as their rows are not marked on the way.
+        """
+        if max_depth is None and cascade_plan(queryset.model).cycles():
+            max_depth = getattr(settings, 'SOFTDELETE_COUNT_MAX_DEPTH', 8)
+        state = {'deleted_at__isnull': deleted}
+        self.dbs[queryset.model] = self.using
+        level = [(queryset.model, queryset.using(self.using).filter(**state))]
+        counts = []
+        depth = 0
+        while level:
+            children = {}
+            for model, qs in level:
+                if counter is None:
+                    rows = qs.count()
+                else:
+                    rows = counter(qs)
+                if not rows:
+                    continue
+                counts.append((depth, model, rows))
+                for relation in self.relations(model):
+                    pks = qs.values('pk')
+                    if self.db_for(relation.model) != self.db_for(model):
+                        # Subqueries cannot span databases.
+                        pks = list(qs.values_list('pk', flat=True))
+                    q = Q(**{relation.lookup: pks})
+                    if relation.model in children:
+                        q = children[relation.model] | q
+                    children[relation.model] = q
+            depth += 1
+            if max_depth is not None and depth > max_depth:
+                break
+            level = [(m, base_queryset(m, self.db_for(m), not deleted).filter(
+                q).filter(**state)) for m, q in children.items()]
+        return counts
+
+    def _run(self, model, pks, value, include_root, related):
+        self.visited = {model: set(pks)}
+        with self.transaction(model):
+            if include_root:
+                self._update(model, pks, value)
+            level = related and [(model, pks)] or []
+            depth = 0
+            while level:
+                level = self._collect(level, value)
+                depth += 1
+                if level:
+                    count(depth=depth)
+                for related_model, related_pks in level:
+                    logging.debug('CASCADE level %d: %d %s rows', depth,
+                                  len(related_pks), related_model.__name__)
+                self._update_level(level, value)
+
+    def _collect(self, level, value):
+        """Returns the children of ``level`` that are not yet in the
+        target state, grouped by model.
+        """
+        children = {}
+        for model, pks in level:
+            for relation in self.relations(model):
+                found = children.setdefault(relation.model, set())
+                manager = base_queryset(relation.model,
+                                        self.db_for(relation.model),
+                                        deleted=value is None)
+                for chunk in chunked(pks, self.chunk_size):
+                    qs = manager.filter(
+                        **{relation.lookup: chunk,
+                           'deleted_at__isnull': value is not None})
+                    found.update(qs.values_list('pk', flat=True))
+        for model, pks in children.items():
+            visited = self.visited.setdefault(model, set())
+            pks.difference_update(visited)
+            visited.update(pks)
+        level = [(m, list(pks)) for m, pks in children.items() if pks]
+        level.sort(key=lambda item: (self.db_for(item[0]),
+                                     item[0]._meta.db_table))
+        return level
+
+    def _update_level(self, level, value):
+        for model, pks in level:
+            self._update(model, pks, value)
+
+    def _update(self, model, pks, value):
+        if not pks:
+            return
+        if value is None:
+            pre_signal, post_signal = pre_undelete, post_undelete
+            pre_bulk, post_bulk = pre_bulk_undelete, post_bulk_undelete
+        else:
+            pre_signal, post_signal = pre_soft_delete, post_soft_delete
+            pre_bulk, post_bulk = pre_bulk_soft_delete, post_bulk_soft_delete
+        using = self.db_for(model)
+        if pre_bulk.receivers:
+            pre_bulk.send(sender=model, pks=pks, using=using)
+        notify = self.send_signals and (pre_signal.receivers or
+                                        post_signal.receivers)
+        qs = base_queryset(model, using, deleted=value is None).filter(
+            deleted_at__isnull=value is not None)
+        archived = is_archived(model)
+        # Rows are always locked in key order (and models in table order,
+        # see _collect) so that concurrent cascades cannot deadlock.
+        for chunk in chunked(sorted(pks), self.chunk_size):
+            instances = ()
+            if notify:
+                instances = qs.in_bulk(chunk).values()
+                for obj in instances:
+                    pre_signal.send(sender=model, instance=obj, using=using)
+            parents = ()
+            if is_counted(model):
+                parents = parent_counts(model, qs.filter(pk__in=chunk))
+            if archived:
+                rows = move(model, chunk, using, value)
+            else:
+                rows = qs.filter(pk__in=chunk).update(deleted_at=value)
+            count(model, rows)
+            invalidate(model, chunk)
+            state_changed(model, using, rows, value is not None, parents)
+            if self.changeset is not None and value is not None:
+                self.changeset.record(model, chunk)
+            for obj in instances:
+                obj.deleted_at = value
+                post_signal.send(sender=model, instance=obj, using=using)
+        if post_bulk.receivers:
+            post_bulk.send(sender=model, pks=pks, using=using)
+
+
+@contextmanager
+def _no_transaction():
+    yield
+
+
+class ParallelCascade(SoftDeleteCascade):
+    """A cascade updating the models of each level concurrently, in a
+    pool of ``workers`` threads (``SOFTDELETE_CASCADE_WORKERS``, 4 by
+    default) each using its own connection.
+
+    Workers commit their updates one model at a time, so the cascade is
+    not atomic; like a streamed one, it is resumed by running it again.
+    Models are handed to workers in table order and rows updated in key
+    order, the same order every cascade locks them in.
+
+    The cascade runs serially when a transaction is already managed on one
+    of its databases (its updates must be part of it) and on SQLite, whose
+    connections cannot write concurrently.
+    """
+    def __init__(self, workers=None, **kwargs):
+        super(ParallelCascade, self).__init__(**kwargs)
+        self.workers = workers or getattr(settings,
+                                          'SOFTDELETE_CASCADE_WORKERS', 4)
+        self.concurrent = False
+
+    def can_run_concurrently(self, aliases):
+        if self.workers < 2:
+            return False
+        for alias in aliases:
+            if transaction.is_managed(using=alias) or \
+                   connections[alias].vendor == 'sqlite':
+                return False
+        return True
+
+    def transaction(self, model=None):
+        if model is not None and (self.concurrent or
+                                  self.can_run_concurrently(
+                                      cascade_aliases(model, self.using))):
+            self.dbs[model] = self.using
+            self.concurrent = True
+            return _no_transaction()
+        return super(ParallelCascade, self).transaction(model)
+
+    def _update_level(self, level, value):
+        if not self.concurrent or len(level) < 2:
+            return super(ParallelCascade, self)._update_level(level, value)
+        operation = current()
+
+        def update(item):
+            model, pks = item
+            using = self.db_for(model)
+            try:
+                with adopt(operation):
+                    with cascade_transaction(using):
+                        self._update(model, pks, value)
+            finally:
+                connections[using].close()
+        pool = ThreadPool(min(self.workers, len(level)))
+        try:
+            pool.map(update, level)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class StreamingCascade(SoftDeleteCascade):
+    """A cascade whose memory use is bounded by ``chunk_size``.
+
+    The relation graph is walked depth first, one chunk of keys at a time,
+    and children are paged with keyset pagination (``pk > last``) instead
+    of being collected up front.  A chunk is only marked once its whole
+    subtree has been, and each chunk is committed on its own: a cascade
+    that was interrupted is resumed by running it again.
+    """
+    def _run(self, model, pks, value, include_root, related):
+        self.dbs[model] = self.using
+        for chunk in chunked(pks, self.chunk_size):
+            self.process(model, chunk, value, include_root, related)
+
+    def pages(self, queryset, value):
+        """Yields the keys of the rows of ``queryset`` that are not yet in
+        the target state, ``chunk_size`` at a time.
+        """
+        queryset = queryset.filter(deleted_at__isnull=value is not None)
+        queryset = queryset.order_by('pk').values_list('pk', flat=True)
+        page = list(queryset[:self.chunk_size])
+        while page:
+            yield page
+            page = list(queryset.filter(pk__gt=page[-1])[:self.chunk_size])
+
+    def process(self, model, pks, value, include=True, related=True,
+                depth=0):
+        """Marks the subtree of a chunk of ``model`` keys, then the chunk
+        itself when ``include`` is set.
+
+        The subtree is walked with an explicit stack of chunks, each with
+        the pages of its children still to process, so that deep chains
+        (e.g. of rows referencing their parent) do not exhaust the Python
+        stack.
+        """
+        stack = [self._frame(model, pks, value, include, related, depth)]
+        while stack:
+            model, pks, include, cyclic, children = stack[-1]
+            for child_model, page in children:
+                stack.append(self._frame(child_model, page, value,
+                                         depth=len(stack) + depth))
+                break
+            else:
+                stack.pop()
+                if include:
+                    with cascade_transaction(self.db_for(model)):
+                        self._update(model, pks, value)
+                if cyclic:
+                    self.visited[model].difference_update(pks)
+
+    def _frame(self, model, pks, value, include=True, related=True,
+               depth=0):
+        count(depth=depth)
+        # Only the keys being processed down the stack are kept: the rows
+        # of a cycle leading back to them are skipped, the others are
+        # already marked once processed.
+        cyclic = model in cascade_plan(model).cycles()
+        if cyclic:
+            in_progress = self.visited.setdefault(model, set())
+            pks = [pk for pk in pks if pk not in in_progress]
+            in_progress.update(pks)
+        children = iter(())
+        if related and pks:
+            children = self._children(model, pks, value)
+        return model, pks, include, cyclic, children
+
+    def _children(self, model, pks, value):
+        """Yields ``(model, keys)`` for the pages of rows referencing the
+        keys ``pks`` of ``model``.
+        """
+        for relation in self.relations(model):
+            children = base_queryset(
+                relation.model, self.db_for(relation.model),
+                deleted=value is None).filter(**{relation.lookup: pks})
+            for page in self.pages(children, value):
+                yield relation.model, page
@@ -0,0 +1,143 @@
+"""Maintained counts of the live and soft-deleted rows of models.
+
+A model opts in with ``soft_delete_counters``, the names of the foreign
+keys to also count its rows per parent by (an empty tuple counts the
+model as a whole only)::
+
+    class Comment(SoftDeleteObject):
+        post = models.ForeignKey(Post)
+        soft_delete_counters = ('post',)
+
+``Comment.objects.counts()`` and ``post.comment_set.counts()`` then read
+``(live, deleted)`` from a ``SoftDeleteCounter`` row instead of counting.
+Counters are updated with ``F()`` increments, in the same transaction, by
+object creation and deletion, and by every soft-delete and undelete
+(cascades, changeset restores and purges included).  Moving a row to
+another parent with ``save`` is not tracked: ``manage.py
+softdelete_counters`` recomputes the counters, chunk by chunk.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+
+
+def is_counted(model):
+    return getattr(model, 'soft_delete_counters', None) is not None
+
+
+def parent_counts(model, qs):
+    """Returns ``(field, parent, rows)`` for the rows of ``qs`` per parent
+    of every counted foreign key of ``model``.
+    """
+    counts = []
+    for name in getattr(model, 'soft_delete_counters', None) or ():
+        attname = model._meta.get_field(name).attname
+        for row in qs.values(attname).annotate(
+                rows=Count('pk')).order_by():
+            if row[attname] is not None:
+                counts.append((name, row[attname], row['rows']))
+    return counts
+
+
+def instance_parents(obj):
+    model = obj.__class__
+    parents = []
+    for name in getattr(model, 'soft_delete_counters', None) or ():
+        parent = getattr(obj, model._meta.get_field(name).attname)
+        if parent is not None:
+            parents.append((name, parent, 1))
+    return parents
+
+
+def update_counters(model, using, rows, live, deleted, parents=()):
+    """Adds ``live * rows`` and ``deleted * rows`` to the counters of
+    ``model``, and the same per parent for ``(field, parent, rows)`` in
+    ``parents``.
+    """
+    from softdelete.models import SoftDeleteCounter
+    if not rows or not is_counted(model):
+        return
+    counters = SoftDeleteCounter.objects.db_manager(using)
+    content_type = ContentType.objects.db_manager(using).get_for_model(model)
+    counters.add(content_type, '', '', live * rows, deleted * rows)
+    for field, parent, parent_rows in parents:
+        counters.add(content_type, field, parent, live * parent_rows,
+                     deleted * parent_rows)
+
+
+def state_changed(model, using, rows, deleted, parents=()):
+    """Moves ``rows`` rows of ``model`` from live to deleted, or back when
+    ``deleted`` is false.
+    """
+    sign = deleted and 1 or -1
+    update_counters(model, using, rows, -sign, sign, parents)
+
+
+def instance_saved(sender, instance, created=False, using=None, **kwargs):
+    if created and is_counted(sender):
+        deleted = instance.deleted_at is not None
+        update_counters(sender, using, 1, int(not deleted), int(deleted),
+                        instance_parents(instance))
+
+
+def instance_deleted(sender, instance, using=None, **kwargs):
+    if is_counted(sender):
+        deleted = instance.deleted_at is not None
+        update_counters(sender, using, 1, -int(not deleted), -int(deleted),
+                        instance_parents(instance))
+
+post_save.connect(instance_saved,
+                  dispatch_uid='softdelete.counters.instance_saved')
+post_delete.connect(instance_deleted,
+                    dispatch_uid='softdelete.counters.instance_deleted')
+
+
+def counted_models(app_labels=()):
+    """The models with counters, in ``app_labels`` if given."""
+    if app_labels:
+        candidates = []
+        for label in app_labels:
+            if '.' in label:
+                candidates.append(models.get_model(*label.split('.', 1)))
+            else:
+                candidates.extend(models.get_models(models.get_app(label)))
+    else:
+        candidates = models.get_models()
+    return [model for model in candidates
+            if model is not None and is_counted(model)]
+
+
+def reconcile(model, using, chunk_size=500):
+    """Recomputes the counters of ``model`` from its rows, reading them in
+    chunks of keys, and returns the model totals ``(live, deleted)``.
+    """
+    from softdelete.archive import base_queryset
+    from softdelete.cascade import cascade_transaction
+    from softdelete.models import SoftDeleteCounter
+    totals = {('', ''): [0, 0]}
+    for deleted in (False, True):
+        qs = base_queryset(model, using, deleted).filter(
+            deleted_at__isnull=not deleted).order_by('pk')
+        last = None
+        while True:
+            page = qs
+            if last is not None:
+                page = qs.filter(pk__gt=last)
+            pks = list(page.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            last = pks[-1]
+            chunk = qs.filter(pk__gte=pks[0], pk__lte=last)
+            totals[('', '')][deleted] += len(pks)
+            for field, parent, rows in parent_counts(model, chunk):
+                totals.setdefault((field, unicode(parent)), [0, 0])
+                totals[(field, unicode(parent))][deleted] += rows
+    content_type = ContentType.objects.db_manager(using).get_for_model(model)
+    counters = SoftDeleteCounter.objects.db_manager(using)
+    with cascade_transaction(using):
+        counters.filter(content_type=content_type).delete()
+        for (field, parent), (live, deleted) in totals.items():
+            counters.create(content_type=content_type, field=field,
+                            parent=parent, live=live, deleted=deleted)
+    return tuple(totals[('', '')])
@@ -0,0 +1,95 @@
+"""Executors running the cascade of ``soft_delete(background=True)``.
+
+The object (or the queryset rows) is marked synchronously and a
+``CascadeJob`` is saved in the same transaction; the executor named by
+``settings.SOFTDELETE_CASCADE_EXECUTOR`` then runs it:
+
+``ThreadExecutor`` (the default)
+    runs jobs in a pool of ``SOFTDELETE_CASCADE_THREADS`` threads of the
+    current process.
+``DatabaseExecutor``
+    leaves jobs in the table for ``manage.py softdelete_worker``.
+``SynchronousExecutor``
+    runs jobs right away, mostly for tests.
+
+Jobs left pending (enqueued inside a transaction that was still open, or
+by a process that died) are picked up by ``softdelete_worker`` as well.
+"""
+import logging
+import threading
+from Queue import Queue
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils.importlib import import_module
+
+
+def run_job(pk, using):
+    """Runs the job ``pk`` unless another executor already claimed it."""
+    from softdelete.models import CascadeJob
+    job = CascadeJob.objects.db_manager(using).claim(pk)
+    if job is not None:
+        job.run()
+
+
+class BaseExecutor(object):
+    def submit(self, job):
+        raise NotImplementedError
+
+
+class SynchronousExecutor(BaseExecutor):
+    def submit(self, job):
+        run_job(job.pk, job._state.db)
+
+
+class DatabaseExecutor(BaseExecutor):
+    def submit(self, job):
+        pass
+
+
+class ThreadExecutor(BaseExecutor):
+    def __init__(self, threads=None):
+        self.threads = threads or getattr(settings,
+                                          'SOFTDELETE_CASCADE_THREADS', 2)
+        self.queue = Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        self.start()
+        self.queue.put((job.pk, job._state.db))
+
+    def start(self):
+        with self.lock:
+            while len(self.workers) < self.threads:
+                worker = threading.Thread(target=self.work)
+                worker.setDaemon(True)
+                worker.start()
+                self.workers.append(worker)
+
+    def work(self):
+        while True:
+            pk, using = self.queue.get()
+            try:
+                run_job(pk, using)
+            except Exception:
+                logging.exception('Cascade job %s failed', pk)
+            finally:
+                connections[using].close()
+                self.queue.task_done()
+
+
+_executors = {}
+
+
+def get_executor():
+    path = getattr(settings, 'SOFTDELETE_CASCADE_EXECUTOR',
+                   'softdelete.executors.ThreadExecutor')
+    if path not in _executors:
+        module, sep, name = path.rpartition('.')
+        try:
+            _executors[path] = getattr(import_module(module), name)()
+        except (ImportError, AttributeError), e:
+            raise ImproperlyConfigured('Error loading cascade executor %s: %s'
+                                       % (path, e))
+    return _executors[path]
@@ -0,0 +1,191 @@
+"""Indexes backing the ``deleted_at IS NULL`` filter of soft-delete models.
+
+A model declares the columns its live rows are looked up by::
+
+    class Event(SoftDeleteObject):
+        soft_delete_indexes = (('account', 'created'),)
+
+On PostgreSQL and SQLite each entry becomes a partial index restricted to
+``WHERE deleted_at IS NULL``; other databases get a composite index ending
+with ``deleted_at``.  An empty tuple indexes ``deleted_at`` alone.
+Declared indexes are created by ``syncdb``; existing tables can get them
+from a migration with ``create_live_indexes``.
+
+Models setting ``soft_delete_history = True`` also get an index on
+``(deleted_at, pk)`` of their soft-deleted rows, for the range scans of
+``deleted_between`` and ``deleted_since``; ``create_history_index`` adds it
+to existing tables.
+
+The changeset records get an index on ``(content_type, min_pk, max_pk)``,
+which ``ChangeSet.objects.covering`` filters on; ``syncdb`` creates it with
+``create_record_index`` and migration 0006 adds it to existing tables.
+"""
+import sqlite3
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends.util import truncate_name
+from softdelete.archive import archive_table, is_archived
+from softdelete.models import SoftDeleteRecord
+
+
+def supports_partial_indexes(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and \
+           sqlite3.sqlite_version_info >= (3, 8, 0)
+
+
+def _columns(model, fields):
+    opts = model._meta
+    return [name == 'pk' and opts.pk.column or opts.get_field(name).column
+            for name in fields]
+
+
+def live_index_name(model, fields, connection):
+    name = '%s_%s_live' % (model._meta.db_table,
+                           '_'.join(_columns(model, fields)))
+    return truncate_name(name, connection.ops.max_name_length())
+
+
+def live_index_sql(model, fields, using=DEFAULT_DB_ALIAS):
+    """Returns the ``CREATE INDEX`` statement of the live-rows index of
+    ``model`` on ``fields``.  An empty ``fields`` indexes ``deleted_at``
+    alone.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    columns = [qn(c) for c in _columns(model, fields)]
+    deleted_at = qn(model._meta.get_field('deleted_at').column)
+    where = ''
+    if columns and supports_partial_indexes(connection):
+        where = ' WHERE %s IS NULL' % deleted_at
+    else:
+        columns.append(deleted_at)
+    return 'CREATE INDEX %s ON %s (%s)%s' % (
+        qn(live_index_name(model, fields, connection)),
+        qn(model._meta.db_table), ', '.join(columns), where)
+
+
+def create_live_index(model, fields, using=DEFAULT_DB_ALIAS):
+    connections[using].cursor().execute(live_index_sql(model, fields, using))
+
+
+def drop_live_index(model, fields, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    name = connection.ops.quote_name(
+        live_index_name(model, fields, connection))
+    if connection.vendor == 'mysql':
+        sql = 'DROP INDEX %s ON %s' % (
+            name, connection.ops.quote_name(model._meta.db_table))
+    else:
+        sql = 'DROP INDEX %s' % name
+    connection.cursor().execute(sql)
+
+
+def create_live_indexes(model, using=DEFAULT_DB_ALIAS):
+    """Creates the indexes declared in ``model.soft_delete_indexes`` that
+    do not exist yet.
+    """
+    existing = deleted_at_indexes(model, using)
+    connection = connections[using]
+    for fields in getattr(model, 'soft_delete_indexes', ()):
+        if live_index_name(model, fields, connection) not in existing:
+            create_live_index(model, fields, using)
+
+
+def history_table(model):
+    """The table holding the soft-deleted rows of ``model``."""
+    if is_archived(model):
+        return archive_table(model)
+    return model._meta.db_table
+
+
+def history_index_name(model, connection):
+    return truncate_name('%s_deleted_history' % history_table(model),
+                         connection.ops.max_name_length())
+
+
+def history_index_sql(model, using=DEFAULT_DB_ALIAS):
+    """Returns the ``CREATE INDEX`` statement of the index on
+    ``(deleted_at, pk)`` of the soft-deleted rows of ``model``, in its
+    archive table if it has one.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    deleted_at = qn(model._meta.get_field('deleted_at').column)
+    where = ''
+    if not is_archived(model) and supports_partial_indexes(connection):
+        where = ' WHERE %s IS NOT NULL' % deleted_at
+    return 'CREATE INDEX %s ON %s (%s, %s)%s' % (
+        qn(history_index_name(model, connection)),
+        qn(history_table(model)), deleted_at, qn(model._meta.pk.column),
+        where)
+
+
+def create_history_index(model, using=DEFAULT_DB_ALIAS):
+    """Creates the history index of ``model`` unless it exists."""
+    connection = connections[using]
+    if history_index_name(model, connection) not in deleted_at_indexes(
+            model, using, history_table(model)):
+        connection.cursor().execute(history_index_sql(model, using))
+
+
+def record_index_sql(using=DEFAULT_DB_ALIAS):
+    """Returns the ``CREATE INDEX`` statement of the index on
+    ``(content_type, min_pk, max_pk)`` of the changeset records.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    return 'CREATE INDEX %s ON %s (%s)' % (
+        qn(record_index_name(connection)),
+        qn(SoftDeleteRecord._meta.db_table),
+        ', '.join([qn(c) for c in _columns(
+            SoftDeleteRecord, ('content_type', 'min_pk', 'max_pk'))]))
+
+
+def record_index_name(connection):
+    return truncate_name('%s_range' % SoftDeleteRecord._meta.db_table,
+                         connection.ops.max_name_length())
+
+
+def create_record_index(using=DEFAULT_DB_ALIAS):
+    """Creates the index of the changeset records unless it exists."""
+    connection = connections[using]
+    column = SoftDeleteRecord._meta.get_field('content_type').column
+    if record_index_name(connection) not in deleted_at_indexes(
+            SoftDeleteRecord, using, column=column):
+        connection.cursor().execute(record_index_sql(using))
+
+
+def deleted_at_indexes(model, using=DEFAULT_DB_ALIAS, table=None,
+                       column=None):
+    """Returns the names of the existing indexes of ``model`` (or of its
+    ``table``) that cover its ``deleted_at`` column, or ``column``.
+    """
+    connection = connections[using]
+    cursor = connection.cursor()
+    table = table or model._meta.db_table
+    column = column or model._meta.get_field('deleted_at').column
+    if connection.vendor == 'sqlite':
+        cursor.execute("SELECT name, sql FROM sqlite_master "
+                       "WHERE type = 'index' AND tbl_name = %s", [table])
+    elif connection.vendor == 'postgresql':
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes "
+                       "WHERE tablename = %s", [table])
+    elif connection.vendor == 'mysql':
+        cursor.execute('SHOW INDEX FROM %s' %
+                       connection.ops.quote_name(table))
+        return sorted(set([row[2] for row in cursor.fetchall()
+                           if row[4] == column]))
+    else:
+        indexes = connection.introspection.get_indexes(cursor, table)
+        return column in indexes and [column] or []
+    return sorted([name for name, sql in cursor.fetchall()
+                   if sql and column in sql])
+
+
+def filters_deleted_at(manager, using=DEFAULT_DB_ALIAS):
+    """Tells whether the queries of ``manager`` filter on ``deleted_at``."""
+    query = manager.get_query_set().query
+    sql, params = query.get_compiler(using).as_sql()
+    column = manager.model._meta.get_field('deleted_at').column
+    return ' WHERE ' in sql and column in sql.split(' WHERE ', 1)[1]
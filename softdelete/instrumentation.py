@@ -0,0 +1,184 @@
+"""Measurements of soft-delete operations.
+
+Every ``soft_delete``/``undelete`` of an object or queryset, changeset
+restore and cascade job is measured as an ``Operation``: wall time,
+queries issued by the cascade, rows marked per model and depth reached.
+Operations nested in another one (the cascade of each object of a
+queryset, the changeset restored by an undelete) are added to it.
+Queries are counted at the cursor: every statement executed on any
+database while an operation is measured, changeset and content type
+lookups included, is added to it.
+
+Finished operations are sent with the ``soft_delete_measured`` signal and
+passed to the callable named by ``settings.SOFTDELETE_COLLECTOR``, e.g.::
+
+    def collect(operation):
+        statsd.timing('softdelete.%s' % operation.name, operation.seconds)
+        statsd.incr('softdelete.rows', operation.total_rows())
+
+Nothing is measured when there is neither a receiver nor a collector.
+"""
+from contextlib import contextmanager
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils.importlib import import_module
+from softdelete.signals import soft_delete_measured
+
+
+class Operation(object):
+    def __init__(self, name, model, using):
+        self.name = name
+        self.model = model
+        self.using = using
+        self.queries = 0
+        self.rows = {}
+        self.depth = 0
+        self.started = time.time()
+        self.seconds = None
+
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    def __repr__(self):
+        return '<Operation %s %s: %.3fs, %d queries, %d rows, depth %d>' % (
+            self.name, self.model.__name__, self.seconds or 0, self.queries,
+            self.total_rows(), self.depth)
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_collectors = {}
+
+
+def get_collector():
+    path = getattr(settings, 'SOFTDELETE_COLLECTOR', None)
+    if not path:
+        return None
+    if path not in _collectors:
+        module, sep, name = path.rpartition('.')
+        try:
+            _collectors[path] = getattr(import_module(module), name)
+        except (ImportError, AttributeError), e:
+            raise ImproperlyConfigured('Error loading collector %s: %s'
+                                       % (path, e))
+    return _collectors[path]
+
+
+def current():
+    """Returns the operation being measured in this thread, if any."""
+    return getattr(_local, 'operation', None)
+
+
+class CountingCursor(object):
+    """Counts the statements executed through ``cursor`` in the operation
+    being measured.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        _executed()
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        _executed()
+        return self.cursor.executemany(sql, param_list)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+def _executed():
+    operation = current()
+    if operation is not None:
+        with _lock:
+            operation.queries += 1
+
+
+@contextmanager
+def counting_cursors():
+    """Makes the connections of this thread return ``CountingCursor``
+    objects during the block.
+    """
+    patched = []
+    for alias in connections:
+        connection = connections[alias]
+        if 'cursor' in connection.__dict__:
+            continue
+        connection.cursor = _counting(connection.cursor)
+        patched.append(connection)
+    try:
+        yield
+    finally:
+        for connection in patched:
+            del connection.cursor
+
+
+def _counting(cursor):
+    def counting_cursor():
+        return CountingCursor(cursor())
+    return counting_cursor
+
+
+@contextmanager
+def measure(name, model, using):
+    """Measures the block as the operation ``name`` unless it is part of
+    an operation already being measured.
+    """
+    if current() is not None or not (soft_delete_measured.receivers or
+                                     get_collector()):
+        yield current()
+        return
+    operation = _local.operation = Operation(name, model, using)
+    try:
+        with counting_cursors():
+            yield operation
+    finally:
+        _local.operation = None
+        operation.seconds = time.time() - operation.started
+    soft_delete_measured.send(sender=model, operation=operation)
+    collector = get_collector()
+    if collector is not None:
+        collector(operation)
+
+
+def count(model=None, rows=0, depth=0):
+    """Adds rows marked and depth reached to the operation being measured,
+    if any.
+    """
+    operation = current()
+    if operation is None:
+        return
+    with _lock:
+        if model is not None:
+            operation.rows[model] = operation.rows.get(model, 0) + rows
+        if depth > operation.depth:
+            operation.depth = depth
+
+
+@contextmanager
+def adopt(operation):
+    """Adds what the block does in this thread to ``operation``, which
+    another thread is measuring.
+    """
+    previous = current()
+    _local.operation = operation
+    try:
+        with counting_cursors():
+            yield
+    finally:
+        _local.operation = previous
+
+
+def log_operation(operation):
+    """A collector logging every operation at the INFO level."""
+    logging.info('SOFTDELETE %s %s: %.3fs, %d queries, %d rows, depth %d',
+                 operation.name, operation.model.__name__, operation.seconds,
+                 operation.queries, operation.total_rows(), operation.depth)
@@ -0,0 +1,33 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import get_models, signals
+from softdelete.archive import create_archive
+from softdelete.indexes import create_history_index, create_live_indexes, \
+     create_record_index
+from softdelete.models import SoftDeleteObject, SoftDeleteRecord
+
+
+def create_declared_indexes(app, created_models, verbosity=1, db=None,
+                            **kwargs):
+    for model in get_models(app):
+        if model not in created_models:
+            continue
+        if model is SoftDeleteRecord:
+            create_record_index(using=db or DEFAULT_DB_ALIAS)
+        if issubclass(model, SoftDeleteObject) and model.soft_delete_indexes:
+            if verbosity >= 2:
+                print "Creating soft-delete indexes for %s" % \
+                      model._meta.object_name
+            create_live_indexes(model, using=db or DEFAULT_DB_ALIAS)
+        if issubclass(model, SoftDeleteObject) and model.soft_delete_archive:
+            if verbosity >= 2:
+                print "Creating soft-delete archive for %s" % \
+                      model._meta.object_name
+            create_archive(model, using=db or DEFAULT_DB_ALIAS)
+        if issubclass(model, SoftDeleteObject) and model.soft_delete_history:
+            if verbosity >= 2:
+                print "Creating soft-delete history index for %s" % \
+                      model._meta.object_name
+            create_history_index(model, using=db or DEFAULT_DB_ALIAS)
+
+signals.post_syncdb.connect(create_declared_indexes,
+                            dispatch_uid="softdelete.create_declared_indexes")
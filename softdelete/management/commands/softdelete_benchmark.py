@@ -0,0 +1,63 @@
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import loading
+from softdelete.benchmark import Benchmark, SCENARIOS
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks soft-delete cascades on generated graphs, in a test "
+            "database created for the run.")
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Nominates the database to create the test '
+                         'database on.'),
+        make_option('--depth', action='store', dest='depth', type='int',
+                    default=3, help='Levels of the generated trees.'),
+        make_option('--fan-out', action='store', dest='fan_out', type='int',
+                    default=10, help='Children of every generated object.'),
+        make_option('--roots', action='store', dest='roots', type='int',
+                    default=1, help='Number of generated graphs.'),
+        make_option('--scenario', action='append', dest='scenarios',
+                    help='Runs this scenario only (%s); may be repeated.'
+                         % ', '.join(SCENARIOS)),
+        make_option('--max-seconds', action='store', dest='max_seconds',
+                    type='float',
+                    help='Fails when a scenario takes longer than this.'),
+    )
+
+    def handle(self, **options):
+        scenarios = options['scenarios'] or SCENARIOS
+        for scenario in scenarios:
+            if scenario not in SCENARIOS:
+                raise CommandError('Unknown scenario %r' % scenario)
+        app = 'softdelete.test_softdelete_app'
+        if app not in settings.INSTALLED_APPS:
+            settings.INSTALLED_APPS = list(settings.INSTALLED_APPS) + [app]
+            loading.cache.loaded = False
+        verbosity = int(options['verbosity'])
+        connection = connections[options['database']]
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=max(verbosity - 1, 0))
+        try:
+            benchmark = Benchmark(depth=options['depth'],
+                                  fan_out=options['fan_out'],
+                                  roots=options['roots'],
+                                  using=options['database'])
+            results = benchmark.run(scenarios)
+        finally:
+            connection.creation.destroy_test_db(old_name,
+                                                max(verbosity - 1, 0))
+        if verbosity >= 1:
+            self.stdout.write('%-10s %10s %8s %8s %10s\n' % (
+                'scenario', 'seconds', 'queries', 'rows', 'peak KB'))
+            for result in results:
+                self.stdout.write('%-10s %10.3f %8d %8d %10d\n' % (
+                    result.scenario, result.seconds, result.queries,
+                    result.rows, result.peak_kb))
+        failures = benchmark.check(results, options['max_seconds'])
+        if failures:
+            raise CommandError('Benchmark regressions:\n%s' %
+                               '\n'.join(failures))
@@ -0,0 +1,28 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from softdelete.counters import counted_models, reconcile
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the live and deleted counters of the models with "
+            "soft_delete_counters.")
+    args = '[appname|appname.Model ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Nominates the database to recount.'),
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=500,
+                    help='Rows read per query (defaults to 500).'),
+    )
+
+    def handle(self, *app_labels, **options):
+        verbosity = int(options['verbosity'])
+        for model in counted_models(app_labels):
+            live, deleted = reconcile(model, options['database'],
+                                      options['chunk_size'])
+            if verbosity >= 1:
+                self.stdout.write('%s.%s: %d live, %d deleted\n' % (
+                    model._meta.app_label, model._meta.object_name, live,
+                    deleted))
@@ -0,0 +1,70 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from softdelete.indexes import create_history_index, create_live_index, \
+     deleted_at_indexes, filters_deleted_at, history_index_name, \
+     history_table, live_index_name
+from softdelete.models import SoftDeleteObject
+
+
+class Command(BaseCommand):
+    help = ("Reports the soft-delete models whose managers filter on "
+            "deleted_at without an index covering it.")
+    args = '[appname ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Nominates the database to inspect.'),
+        make_option('--create', action='store_true', dest='create',
+                    default=False,
+                    help='Creates the declared indexes that are missing.'),
+    )
+
+    def handle(self, *app_labels, **options):
+        using = options['database']
+        connection = connections[using]
+        if app_labels:
+            apps = [models.get_app(label) for label in app_labels]
+        else:
+            apps = models.get_apps()
+        for app in apps:
+            for model in models.get_models(app):
+                if issubclass(model, SoftDeleteObject):
+                    self.check_model(model, connection, using,
+                                     options['create'])
+
+    def check_model(self, model, connection, using, create):
+        label = '%s.%s' % (model._meta.app_label, model._meta.object_name)
+        history = history_index_name(model, connection)
+        existing = [name for name in deleted_at_indexes(model, using)
+                    if name != history]
+        for fields in model.soft_delete_indexes:
+            name = live_index_name(model, fields, connection)
+            if name in existing:
+                continue
+            if create:
+                create_live_index(model, fields, using)
+                existing.append(name)
+                self.stdout.write('%s: created %s\n' % (label, name))
+            else:
+                self.stdout.write('%s: declared index on %s is missing\n' %
+                                  (label, ', '.join(fields)))
+        if model.soft_delete_history and history not in \
+               deleted_at_indexes(model, using, history_table(model)):
+            if create:
+                create_history_index(model, using)
+                self.stdout.write('%s: created %s\n' % (label, history))
+            else:
+                self.stdout.write('%s: history index is missing\n' % label)
+        filtering = [name for name, manager in self.managers(model)
+                     if filters_deleted_at(manager, using)]
+        if filtering and not existing:
+            self.stdout.write('%s: no index covers deleted_at, used by %s\n'
+                              % (label, ', '.join(filtering)))
+
+    def managers(self, model):
+        opts = model._meta
+        for creation_counter, name, manager in sorted(
+                opts.concrete_managers + opts.abstract_managers):
+            if not name.startswith('_'):
+                yield name, getattr(model, name)
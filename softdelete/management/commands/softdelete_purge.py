@@ -0,0 +1,48 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from softdelete.purge import Purge, purgeable_models
+
+
+class Command(BaseCommand):
+    help = ("Hard-deletes the soft-deleted rows older than the "
+            "soft_delete_retention of their model.")
+    args = '[appname|appname.Model ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Nominates the database to purge.'),
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=None,
+                    help='Rows deleted per statement (defaults to '
+                         'SOFTDELETE_CHUNK_SIZE).'),
+        make_option('--sleep', action='store', dest='sleep', type='float',
+                    default=0.0,
+                    help='Seconds to wait between two chunks, to throttle '
+                         'the load on the database.'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Only reports the number of expired rows.'),
+    )
+
+    def handle(self, *app_labels, **options):
+        verbosity = int(options['verbosity'])
+        purge = Purge(using=options['database'],
+                      chunk_size=options['chunk_size'],
+                      sleep=options['sleep'], dry_run=options['dry_run'])
+        if verbosity >= 2:
+            purge.progress = self.progress
+        for model in purgeable_models(app_labels):
+            result = purge.purge(model)
+            if verbosity >= 1:
+                self.stdout.write('%s: %d %s, %d skipped, %d records\n' % (
+                    self.label(model), result.deleted,
+                    options['dry_run'] and 'expired' or 'deleted',
+                    result.skipped, result.records))
+
+    def progress(self, result):
+        self.stdout.write('%s: %d deleted up to pk %s\n' % (
+            self.label(result.model), result.deleted, result.last_pk))
+
+    def label(self, model):
+        return '%s.%s' % (model._meta.app_label, model._meta.object_name)
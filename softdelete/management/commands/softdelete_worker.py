@@ -0,0 +1,47 @@
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from softdelete.models import CascadeJob
+
+
+class Command(BaseCommand):
+    help = "Runs the queued soft-delete cascade jobs."
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Nominates the database holding the jobs.'),
+        make_option('--once', action='store_true', dest='once',
+                    default=False,
+                    help='Exits once no job is pending instead of polling.'),
+        make_option('--poll', action='store', dest='poll', type='float',
+                    default=5.0,
+                    help='Seconds to wait before looking for new jobs.'),
+        make_option('--pause', action='store', dest='pause', type='float',
+                    default=0.0,
+                    help='Seconds to wait between two jobs, to throttle the '
+                         'load on the database.'),
+        make_option('--retry-failed', action='store_true', dest='retry',
+                    default=False,
+                    help='Queues the failed jobs again before starting.'),
+    )
+
+    def handle(self, **options):
+        jobs = CascadeJob.objects.db_manager(options['database'])
+        verbosity = int(options['verbosity'])
+        if options['retry']:
+            jobs.filter(status=CascadeJob.FAILED).update(
+                status=CascadeJob.PENDING)
+        while True:
+            job = jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+            job.run()
+            if verbosity >= 1:
+                self.stdout.write('Job %s (%s of changeset %s): %s\n' % (
+                    job.pk, job.action, job.changeset_id, job.status))
+            if options['pause']:
+                time.sleep(options['pause'])
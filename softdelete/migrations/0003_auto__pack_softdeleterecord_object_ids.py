@@ -0,0 +1,78 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Removing unique constraint on 'SoftDeleteRecord', fields ['changeset', 'content_type', 'object_id']
+        db.delete_unique('softdelete_softdeleterecord', ['changeset_id', 'content_type_id', 'object_id'])
+
+        # Deleting field 'SoftDeleteRecord.object_id'
+        db.delete_column('softdelete_softdeleterecord', 'object_id')
+
+        # Adding field 'SoftDeleteRecord.min_pk'
+        db.add_column('softdelete_softdeleterecord', 'min_pk', self.gf('django.db.models.fields.IntegerField')(default=0), keep_default=False)
+
+        # Adding field 'SoftDeleteRecord.max_pk'
+        db.add_column('softdelete_softdeleterecord', 'max_pk', self.gf('django.db.models.fields.IntegerField')(default=0), keep_default=False)
+
+        # Adding field 'SoftDeleteRecord.object_ids'
+        db.add_column('softdelete_softdeleterecord', 'object_ids', self.gf('django.db.models.fields.TextField')(default=''), keep_default=False)
+
+        # Changing field 'ChangeSet.object_id'
+        db.alter_column('softdelete_changeset', 'object_id', self.gf('django.db.models.fields.PositiveIntegerField')(null=True))
+
+
+    def backwards(self, orm):
+        
+        # Adding field 'SoftDeleteRecord.object_id'
+        db.add_column('softdelete_softdeleterecord', 'object_id', self.gf('django.db.models.fields.PositiveIntegerField')(default=0), keep_default=False)
+
+        # Deleting field 'SoftDeleteRecord.min_pk'
+        db.delete_column('softdelete_softdeleterecord', 'min_pk')
+
+        # Deleting field 'SoftDeleteRecord.max_pk'
+        db.delete_column('softdelete_softdeleterecord', 'max_pk')
+
+        # Deleting field 'SoftDeleteRecord.object_ids'
+        db.delete_column('softdelete_softdeleterecord', 'object_ids')
+
+        # Adding unique constraint on 'SoftDeleteRecord', fields ['changeset', 'content_type', 'object_id']
+        db.create_unique('softdelete_softdeleterecord', ['changeset_id', 'content_type_id', 'object_id'])
+
+        # Changing field 'ChangeSet.object_id'
+        db.alter_column('softdelete_changeset', 'object_id', self.gf('django.db.models.fields.PositiveIntegerField')())
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'softdelete.changeset': {
+            'Meta': {'object_name': 'ChangeSet'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'softdelete.softdeleterecord': {
+            'Meta': {'object_name': 'SoftDeleteRecord'},
+            'changeset': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'soft_delete_records'", 'to': "orm['softdelete.ChangeSet']"}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'min_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'object_ids': ('django.db.models.fields.TextField', [], {})
+        }
+    }
+
+    complete_apps = ['softdelete']
@@ -0,0 +1,77 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'CascadeJob'
+        db.create_table('softdelete_cascadejob', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('action', self.gf('django.db.models.fields.CharField')(max_length=16)),
+            ('status', self.gf('django.db.models.fields.CharField')(default='pending', max_length=16, db_index=True)),
+            ('changeset_id', self.gf('django.db.models.fields.PositiveIntegerField')(db_index=True, null=True, blank=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'])),
+            ('object_ids', self.gf('django.db.models.fields.TextField')()),
+            ('deleted_at', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('send_signals', self.gf('django.db.models.fields.BooleanField')(default=True)),
+            ('created_date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.utcnow)),
+            ('started_date', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('finished_date', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('error', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal('softdelete', ['CascadeJob'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'CascadeJob'
+        db.delete_table('softdelete_cascadejob')
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'softdelete.cascadejob': {
+            'Meta': {'object_name': 'CascadeJob'},
+            'action': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'changeset_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'deleted_at': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'finished_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_ids': ('django.db.models.fields.TextField', [], {}),
+            'send_signals': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'started_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '16', 'db_index': 'True'})
+        },
+        'softdelete.changeset': {
+            'Meta': {'object_name': 'ChangeSet'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'softdelete.softdeleterecord': {
+            'Meta': {'object_name': 'SoftDeleteRecord'},
+            'changeset': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'soft_delete_records'", 'to': "orm['softdelete.ChangeSet']"}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'min_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'object_ids': ('django.db.models.fields.TextField', [], {})
+        }
+    }
+
+    complete_apps = ['softdelete']
@@ -0,0 +1,72 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding index on 'SoftDeleteRecord', fields ['content_type', 'min_pk', 'max_pk']
+        db.create_index('softdelete_softdeleterecord', ['content_type_id', 'min_pk', 'max_pk'])
+
+
+    def backwards(self, orm):
+        
+        # Removing index on 'SoftDeleteRecord', fields ['content_type', 'min_pk', 'max_pk']
+        db.delete_index('softdelete_softdeleterecord', ['content_type_id', 'min_pk', 'max_pk'])
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'softdelete.cascadejob': {
+            'Meta': {'object_name': 'CascadeJob'},
+            'action': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'changeset_id': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'deleted_at': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'finished_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_ids': ('django.db.models.fields.TextField', [], {}),
+            'send_signals': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'started_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'default': "'pending'", 'max_length': '16', 'db_index': 'True'})
+        },
+        'softdelete.changeset': {
+            'Meta': {'object_name': 'ChangeSet'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'softdelete.softdeletecounter': {
+            'Meta': {'unique_together': "(('content_type', 'field', 'parent'),)", 'object_name': 'SoftDeleteCounter'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'deleted': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            'field': ('django.db.models.fields.CharField', [], {'max_length': '100', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'live': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            'parent': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        'softdelete.softdeleterecord': {
+            'Meta': {'object_name': 'SoftDeleteRecord'},
+            'changeset': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'soft_delete_records'", 'to': "orm['softdelete.ChangeSet']"}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'created_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'max_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'min_pk': ('django.db.models.fields.IntegerField', [], {}),
+            'object_ids': ('django.db.models.fields.TextField', [], {})
+        }
+    }
+
+    complete_apps = ['softdelete']
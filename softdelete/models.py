@@ -1,55 +1,347 @@
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from django.conf import settings
 from django.db.models import query
 from django.db import models, connections, router, transaction, IntegrityError
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, Q
+from django.contrib.contenttypes.models import ContentType
 import logging
+import sys
+import traceback
+from softdelete.archive import all_view, archive_table, delete_archived, \
+     is_archived, move, save_archived, use_table
+from softdelete.caching import get_soft_delete_cache, invalidate, is_cached
+from softdelete.counters import instance_parents, is_counted, \
+     state_changed
+from softdelete.cascade import ParallelCascade, SoftDeleteCascade, \
+     StreamingCascade, cascade_aliases, cascade_plan, cascade_transaction, \
+     cascade_transactions, chunked, db_for_model, has_integer_pk
+from softdelete.executors import get_executor
+from softdelete.instrumentation import count, measure
+from softdelete.plan import soft_delete_plan
+from softdelete.related import prefetch
 from softdelete.signals import pre_soft_delete, pre_undelete, \
-     post_soft_delete, post_undelete
+     post_soft_delete, post_undelete, pre_bulk_soft_delete, \
+     post_bulk_soft_delete, pre_bulk_undelete, post_bulk_undelete
+
+
+def cascade_class(parallel):
+    return parallel and ParallelCascade or SoftDeleteCascade
 
 
 class SoftDeleteQuerySet(query.QuerySet):
+    _soft_delete_prefetch = ()
+
     def all_with_deleted(self):
         qs = super(SoftDeleteQuerySet, self).all()
         qs.__class__ = SoftDeleteQuerySet
         return qs
+
+    def delete(self):
+        """Hard-deletes the objects; those of an archived model that are
+        soft-deleted are removed from its archive table.
+        """
+        if not is_archived(self.model):
+            return super(SoftDeleteQuerySet, self).delete()
+        using = self._db or router.db_for_write(self.model)
+        objs = list(self)
+        with cascade_transaction(using):
+            for chunk in chunked([obj for obj in objs
+                                  if obj.deleted_at is not None], 500):
+                delete_archived(chunk, using)
+            live = [obj.pk for obj in objs if obj.deleted_at is None]
+            for chunk in chunked(live, 500):
+                self.model._base_manager.using(using).filter(
+                    pk__in=chunk).delete()
+        self._result_cache = None
+
+    def soft_delete_plan(self, using=None, do_related=True, estimate=False):
+        """Returns the ``SoftDeletePlan`` of ``soft_delete(bulk=True)``
+        without marking anything (see ``softdelete.plan``).
+        """
+        using = using or self._db or router.db_for_write(self.model)
+        return soft_delete_plan(self, using, do_related, estimate,
+                                overhead=2)
+
+    def prefetch_live(self, *names):
+        """Loads the live objects of the relations ``names`` of the
+        objects of the queryset with one query per relation when it is
+        evaluated; ``obj.<name>.all()`` then runs no query.
+        """
+        return self._clone(_soft_delete_prefetch=self._soft_delete_prefetch +
+                           tuple([(name, False) for name in names]))
+
+    def prefetch_with_deleted(self, *names):
+        """Like ``prefetch_live``, including the soft-deleted objects."""
+        return self._clone(_soft_delete_prefetch=self._soft_delete_prefetch +
+                           tuple([(name, True) for name in names]))
+
+    def select_related_live(self, *fields):
+        """``select_related(*fields)`` keeping only the objects whose
+        soft-deletable related objects along ``fields`` are live.
+        """
+        qs = self.select_related(*fields)
+        for path in fields:
+            model = self.model
+            for name in path.split('__'):
+                model = model._meta.get_field(name).rel.to
+            if issubclass(model, SoftDeleteObject):
+                qs = qs.filter(**{'%s__deleted_at__isnull' % path: True})
+        return qs
+
+    def iterator(self):
+        if not self._soft_delete_prefetch:
+            for obj in super(SoftDeleteQuerySet, self).iterator():
+                yield obj
+            return
+        objs = list(super(SoftDeleteQuerySet, self).iterator())
+        for name, with_deleted in self._soft_delete_prefetch:
+            prefetch(objs, name, with_deleted, using=self.db)
+        for obj in objs:
+            yield obj
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_soft_delete_prefetch', self._soft_delete_prefetch)
+        return super(SoftDeleteQuerySet, self)._clone(klass, setup, **kwargs)
     
-    def soft_delete(self, using='default', do_related=True, *args, **kwargs):
-        if not len(self):
+    def soft_delete(self, using=None, do_related=True, *args, **kwargs):
+        """Soft-deletes every object of the queryset, on ``using`` or the
+        database the queryset writes to.
+
+        With ``bulk=True`` no model instance is created: the matching rows
+        are marked with set-based ``UPDATE`` statements and the cascade
+        runs through ``SoftDeleteCascade``.  Per-instance signals are then
+        only sent if ``send_signals=True`` is passed as well.
+
+        ``stream=True`` (with ``bulk``) processes the rows and their
+        cascade in committed chunks through ``StreamingCascade``; pass the
+        ``changeset`` of an interrupted run to resume it.  With
+        ``background=True`` instead, only the rows themselves are marked and
+        their cascade is queued as a ``CascadeJob``.  ``parallel=True``
+        runs the cascade through ``ParallelCascade``.
+        """
+        using = using or self._db or router.db_for_write(self.model)
+        with measure('queryset_soft_delete', self.model, using):
+            if kwargs.pop('bulk', False):
+                return self._bulk_update(datetime.today(), using, do_related,
+                                         **kwargs)
+            logging.debug("STARTING QUERYSET SOFT-DELETE: %s", self.model)
+            for obj in self:
+                logging.debug(" -----  CALLING soft_delete() on %s", obj)
+                obj.soft_delete(using=using, do_related=do_related,
+                                *args, **kwargs)
+
+    def undelete(self, using=None, do_related=True, *args, **kwargs):
+        """Undeletes every object of the queryset; see ``soft_delete`` for
+        the ``using``, ``bulk``, ``send_signals``, ``stream``,
+        ``background`` and ``parallel`` arguments.
+        """
+        using = using or self._db or router.db_for_write(self.model)
+        with measure('queryset_undelete', self.model, using):
+            if kwargs.pop('bulk', False):
+                return self._bulk_update(None, using, do_related, **kwargs)
+            logging.debug("UNDELETING %s", self.model)
+            for obj in self:
+                obj.undelete(using=using, do_related=do_related,
+                             *args, **kwargs)
+            logging.debug("FINISHED UNDELETING %s", self.model)
+
+    def _bulk_update(self, value, using, do_related, send_signals=False,
+                     stream=False, changeset=None, background=False,
+                     parallel=False):
+        qs = self.using(using).filter(deleted_at__isnull=value is not None)
+        # Without a changeset to resume, one is only started once the
+        # queryset turns out to match rows that need the cascade.
+        start = value is not None and changeset is None
+        if stream:
+            return self._stream_update(qs, value, do_related, StreamingCascade(
+                using=using, send_signals=send_signals, changeset=changeset),
+                start=start)
+        cascade = cascade_class(parallel)(
+            using=using, send_signals=send_signals, changeset=changeset)
+        if background and do_related and has_integer_pk(self.model):
+            return self._background_update(qs, value, cascade, start=start)
+        if value is None:
+            bulk_signals = (pre_bulk_undelete, post_bulk_undelete)
+        else:
+            bulk_signals = (pre_bulk_soft_delete, post_bulk_soft_delete)
+        # The bulk signals report the keys, which a plain UPDATE does not
+        # collect.
+        if changeset is None and not send_signals and \
+               not [signal for signal in bulk_signals if signal.receivers] and \
+               not is_archived(self.model) and not is_cached(self.model) and \
+               not is_counted(self.model) and \
+               not (do_related and cascade.relations(self.model)):
+            with cascade.transaction():
+                qs.update(deleted_at=value)
             return
-        logging.debug("STARTING QUERYSET SOFT-DELETE: %s. %s" % (self, len(self)))
-        for obj in self:
-            logging.debug(" -----  CALLING soft_delete() on %s" % obj)
-            obj.soft_delete(using=using, do_related=do_related, *args, **kwargs)
+        with cascade.transaction(self.model):
+            pks = list(qs.values_list('pk', flat=True))
+            if not pks:
+                return
+            if start:
+                cascade.changeset = ChangeSet.objects.db_manager(
+                    using).start(self.model)
+            if value is not None:
+                cascade.soft_delete(self.model, pks, deleted_at=value,
+                                    include_root=True, related=do_related)
+                return
+            if do_related:
+                pks = self._restore_changesets(pks, using, send_signals)
+            cascade.undelete(self.model, pks, include_root=True,
+                             related=do_related)
+
+    def _stream_update(self, qs, value, do_related, cascade, start=False):
+        for pks in cascade.pages(qs, value):
+            if start:
+                cascade.changeset = ChangeSet.objects.db_manager(
+                    cascade.using).start(self.model)
+                start = False
+            if value is None and do_related:
+                pks = self._restore_changesets(pks, cascade.using,
+                                               cascade.send_signals,
+                                               stream=True)
+            cascade.process(self.model, pks, value, related=do_related)
+
+    def _background_update(self, qs, value, cascade, start=False):
+        jobs = CascadeJob.objects.db_manager(cascade.using)
+        with cascade.transaction(self.model):
+            pks = list(qs.values_list('pk', flat=True))
+            if not pks:
+                return
+            if start:
+                cascade.changeset = ChangeSet.objects.db_manager(
+                    cascade.using).start(self.model)
+            if value is not None:
+                cascade.soft_delete(self.model, pks, deleted_at=value,
+                                    include_root=True, related=False)
+                queued = [jobs.enqueue(
+                    CascadeJob.SOFT_DELETE, self.model, pks,
+                    changeset=cascade.changeset, deleted_at=value,
+                    send_signals=cascade.send_signals)]
+            else:
+                cascade.undelete(self.model, pks, include_root=True,
+                                 related=False)
+                queued = jobs.enqueue_undelete(
+                    self.model, pks, send_signals=cascade.send_signals)
+        for job in queued:
+            get_executor().submit(job)
 
-    def undelete(self, using='default', do_related=True, *args, **kwargs):
-        logging.debug("UNDELETING %s" % self)
-        for obj in self:
-            obj.undelete(using=using, do_related=do_related, *args, **kwargs)
-        logging.debug("FINISHED UNDELETING %s" %self)
+    def _restore_changesets(self, pks, using, send_signals, stream=False):
+        """Restores the changesets covering ``pks`` and returns the keys
+        that none of them covered.
+        """
+        changesets = ChangeSet.objects.db_manager(using)
+        covering = changesets.covering(self.model, pks)
+        for changeset in changesets.filter(pk__in=covering.keys()):
+            changeset.restore(send_signals=send_signals, stream=stream)
+        covered = set()
+        for changeset_pks in covering.values():
+            covered.update(changeset_pks)
+        return [pk for pk in pks if pk not in covered]
 
 
 class SoftDeleteManager(models.Manager):
     def get_query_set(self):
         qs = super(SoftDeleteManager,self).get_query_set().filter(deleted_at__isnull=1)
+        through = getattr(self, 'through', None)
+        if (hasattr(self, 'source_field_name') and
+                issubclass(through, SoftDeleteObject)):
+            # it's a ManyRelatedManager: skip the soft-deleted links too
+            qs = qs.filter(pk__in=through._base_manager.filter(
+                deleted_at__isnull=True,
+                **{self.source_field_name: self._pk_val}).values(
+                self.target_field_name))
         qs.__class__ = SoftDeleteQuerySet
         return qs
 
-    def all_with_deleted(self, prt=False):
+    def _all_query_set(self, table=None):
+        qs = super(SoftDeleteManager, self).get_query_set()
+        if table is not None and is_archived(self.model):
+            qs = use_table(qs, table(self.model))
         if hasattr(self, 'core_filters'): # it's a RelatedManager
-            qs = super(SoftDeleteManager, self).get_query_set().filter(**self.core_filters)
-        else:
-            qs = super(SoftDeleteManager, self).get_query_set()
+            qs = qs.filter(**self.core_filters)
+        return qs
+
+    def all_with_deleted(self, prt=False):
+        qs = self._all_query_set(all_view)
         qs.__class__ = SoftDeleteQuerySet
         return qs
 
     def soft_deleted_set(self):
-        qs = super(SoftDeleteManager, self).get_query_set().filter(deleted_at__isnull=0)
+        qs = self._all_query_set(archive_table).filter(deleted_at__isnull=0)
         qs.__class__ = SoftDeleteQuerySet
         return qs
 
+    def alive_at(self, when):
+        """Returns the objects that were not soft-deleted at ``when``, as
+        far as ``deleted_at`` tells: objects created since, or soft-deleted
+        before and undeleted since, are included.
+        """
+        return self.all_with_deleted().filter(
+            Q(deleted_at__isnull=True) | Q(deleted_at__gt=when))
+
+    def deleted_between(self, start, end=None):
+        """Returns the objects soft-deleted from ``start`` (included) to
+        ``end`` (excluded, open when None), by ``deleted_at`` then key.
+        """
+        qs = self.soft_deleted_set().filter(deleted_at__gte=start)
+        if end is not None:
+            qs = qs.filter(deleted_at__lt=end)
+        return qs.order_by('deleted_at', 'pk')
+
+    def deleted_since(self, since, pk=None):
+        """Returns the objects soft-deleted since ``since``, by
+        ``deleted_at`` then key, starting after the object ``pk`` when
+        given: slices of it page through the deleted rows by keyset, each
+        page starting after the ``(deleted_at, pk)`` of the last row of the
+        previous one.
+        """
+        qs = self.soft_deleted_set().filter(deleted_at__gte=since)
+        if pk is not None:
+            qs = qs.filter(Q(deleted_at__gt=since) | Q(pk__gt=pk))
+        return qs.order_by('deleted_at', 'pk')
+
+    def _cached_pk(self, args, kwargs):
+        """Returns the primary key looked up by ``get(*args, **kwargs)``
+        when its result can be cached (see ``softdelete.caching``).
+        """
+        if args or len(kwargs) != 1 or not is_cached(self.model) or \
+               hasattr(self, 'core_filters'):
+            return None
+        pk = self.model._meta.pk
+        name, value = kwargs.items()[0]
+        if name not in ('pk', 'pk__exact', pk.name, pk.attname,
+                        pk.name + '__exact'):
+            return None
+        return pk.to_python(value)
+
+    def counts(self):
+        """Returns the numbers of live and soft-deleted objects, read from
+        the maintained counters when the model has them (see
+        ``softdelete.counters``).
+        """
+        if is_counted(self.model):
+            field, parent = '', ''
+            filters = getattr(self, 'core_filters', None)
+            if filters and len(filters) == 1:
+                lookup, parent = filters.items()[0]
+                field = lookup.split('__')[0]
+            if not filters or field in self.model.soft_delete_counters:
+                return SoftDeleteCounter.objects.db_manager(self.db).counts(
+                    self.model, field, parent)
+        return self.get_query_set().count(), self.soft_deleted_set().count()
+
     def get(self, *args, **kwargs):
-        return self.all_with_deleted().get(*args, **kwargs)
+        pk = self._cached_pk(args, kwargs)
+        if pk is not None:
+            obj = get_soft_delete_cache().get(self.model, pk)
+            if obj is not None:
+                return obj
+        obj = self.all_with_deleted().get(*args, **kwargs)
+        if pk is not None:
+            get_soft_delete_cache().set(self.model, obj)
+        return obj
 
     def filter(self, *args, **kwargs):
         if 'pk' in kwargs:
@@ -59,39 +351,165 @@ class SoftDeleteManager(models.Manager):
         qs.__class__ = SoftDeleteQuerySet
         return qs
 
-    def get_or_create(self, **kwargs):
+    def _field_names(self, kwargs):
+        names = dict([(f.attname, f.name) for f in self.model._meta.fields])
+        return dict([(names.get(k, k), v) for k, v in kwargs.items()])
+
+    def _update_returning(self, lookup, values):
+        """Updates the object matching ``lookup``, deleted or not, with
+        ``values`` and returns it, or None if there is no match.
+
+        On PostgreSQL this is a single ``UPDATE ... RETURNING``; elsewhere,
+        or for models with counters or an archive, a select followed by an
+        update.
+        """
+        qs = self.all_with_deleted().using(self.db).filter(**lookup)
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql' or is_counted(self.model) or \
+               is_archived(self.model):
+            try:
+                obj = qs.get()
+            except self.model.DoesNotExist:
+                return None
+            was_deleted = obj.deleted_at is not None
+            parents = instance_parents(obj)
+            for name, value in values.items():
+                setattr(obj, name, value)
+            if is_archived(self.model):
+                self._update_archived(obj, values, was_deleted)
+            else:
+                qs.filter(pk=obj.pk).update(**values)
+            invalidate(self.model, [obj.pk])
+            if (obj.deleted_at is not None) != was_deleted:
+                state_changed(self.model, self.db, 1, not was_deleted,
+                              parents)
+            return obj
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        columns, params = [], []
+        for name, value in values.items():
+            field = opts.get_field(name)
+            if hasattr(value, 'prepare_database_save'):
+                value = value.prepare_database_save(field)
+            else:
+                value = field.get_db_prep_save(value, connection=connection)
+            columns.append('%s = %%s' % qn(field.column))
+            params.append(value)
+        where, where_params = qs.values('pk').query.get_compiler(
+            self.db).as_sql()
+        sid = transaction.savepoint(using=self.db)
+        cursor = connection.cursor()
+        cursor.execute('UPDATE %s SET %s WHERE %s IN (%s) RETURNING %s' % (
+            qn(opts.db_table), ', '.join(columns), qn(opts.pk.column), where,
+            ', '.join([qn(f.column) for f in opts.fields])),
+            params + list(where_params))
+        rows = cursor.fetchall()
+        if len(rows) > 1:
+            transaction.savepoint_rollback(sid, using=self.db)
+            raise self.model.MultipleObjectsReturned(
+                "update_or_create() matched %d %s objects" % (
+                    len(rows), opts.object_name))
+        transaction.savepoint_commit(sid, using=self.db)
+        transaction.commit_unless_managed(using=self.db)
+        if not rows:
+            return None
+        invalidate(self.model, [rows[0][opts.pk_index()]])
+        obj = self.model(*rows[0])
+        obj._state.adding = False
+        obj._state.db = self.db
+        return obj
+
+    def _update_archived(self, obj, values, was_deleted):
+        """Writes ``values``, already set on ``obj``, to the table of the
+        archived model holding its row, then moves the row if
+        ``deleted_at`` changed.
+        """
+        others = dict([(k, v) for k, v in values.items() if k != 'deleted_at'])
+        with cascade_transaction(self.db):
+            if was_deleted:
+                save_archived(obj, self.db)
+                if obj.deleted_at is None:
+                    move(self.model, [obj.pk], self.db, None)
+                return
+            if others:
+                self.model._base_manager.using(self.db).filter(
+                    pk=obj.pk).update(**others)
+            if obj.deleted_at is not None:
+                move(self.model, [obj.pk], self.db, obj.deleted_at)
+
+    def _create(self, kwargs, defaults, retry):
+        try:
+            params = dict([(k, v) for k, v in kwargs.items() if '__' not in k])
+            params.update(defaults)
+            obj = self.model(**params)
+            sid = transaction.savepoint(using=self.db)
+            obj.save(force_insert=True, using=self.db)
+            transaction.savepoint_commit(sid, using=self.db)
+            return obj, True
+        except IntegrityError, e:
+            transaction.savepoint_rollback(sid, using=self.db)
+            exc_info = sys.exc_info()
+            obj = retry()
+            if obj is None:
+                # Re-raise the IntegrityError with its original traceback.
+                raise exc_info[1], None, exc_info[2]
+            return obj, False
+
+    def get_or_create(self, resurrect=False, **kwargs):
         """
         Looks up an object with the given kwargs, creating one if necessary.
         Returns a tuple of (object, created), where created is a boolean
         specifying whether an object was created.
+
+        A soft-deleted match is returned as it is, unless ``resurrect`` is
+        set: it is then undeleted in place (the row only, without cascade
+        nor signals), in the same query that looks it up on PostgreSQL.
         """
         assert kwargs, \
                 'get_or_create() must be passed at least one keyword argument'
         defaults = kwargs.pop('defaults', {})
-        lookup = kwargs.copy()
-        for f in self.model._meta.fields:
-            if f.attname in lookup:
-                lookup[f.name] = lookup.pop(f.attname)
-        try:
-            self._for_write = True
-            return self.get(**lookup), False
-        except self.model.DoesNotExist:
+        lookup = self._field_names(kwargs)
+        self._for_write = True
+
+        def lookup_object():
+            if resurrect:
+                return self._update_returning(lookup, {'deleted_at': None})
             try:
-                params = dict([(k, v) for k, v in kwargs.items() if '__' not in k])
-                params.update(defaults)
-                obj = self.model(**params)
-                sid = transaction.savepoint(using=self.db)
-                obj.save(force_insert=True, using=self.db)
-                transaction.savepoint_commit(sid, using=self.db)
-                return obj, True
-            except IntegrityError, e:
-                transaction.savepoint_rollback(sid, using=self.db)
-                exc_info = sys.exc_info()
-                try:
-                    return self.get(**lookup), False
-                except self.model.DoesNotExist:
-                    # Re-raise the IntegrityError with its original traceback.
-                    raise exc_info[1], None, exc_info[2]
+                return self.get(**lookup)
+            except self.model.DoesNotExist:
+                return None
+        obj = lookup_object()
+        if obj is not None:
+            return obj, False
+        return self._create(kwargs, defaults, lookup_object)
+
+    def update_or_create(self, defaults=None, resurrect=False, **kwargs):
+        """
+        Updates the object matching the given kwargs with ``defaults``,
+        creating one if necessary.  Returns a tuple of (object, created).
+
+        A soft-deleted match is updated but stays deleted, unless
+        ``resurrect`` is set: it is then undeleted by the same update (the
+        row only, without cascade nor signals).  On PostgreSQL an existing
+        object is updated and returned by a single query.
+        """
+        assert kwargs, \
+                'update_or_create() must be passed at least one keyword argument'
+        defaults = defaults or {}
+        values = self._field_names(defaults)
+        if resurrect:
+            values['deleted_at'] = None
+        if not values:
+            return self.get_or_create(**kwargs)
+        lookup = self._field_names(kwargs)
+        self._for_write = True
+
+        def update_object():
+            return self._update_returning(lookup, values)
+        obj = update_object()
+        if obj is not None:
+            return obj, False
+        return self._create(kwargs, defaults, update_object)
 
 
 class SoftDeleteObject(models.Model):
@@ -99,6 +517,28 @@ class SoftDeleteObject(models.Model):
                                       editable=False)
     objects = SoftDeleteManager()
 
+    # Field names of the live-rows indexes (see softdelete.indexes).
+    soft_delete_indexes = ()
+
+    # How long soft-deleted rows are kept before softdelete_purge
+    # hard-deletes them (a timedelta), or None to keep them forever.
+    soft_delete_retention = None
+
+    # Whether soft-deleted rows are moved to an archive table (see
+    # softdelete.archive).
+    soft_delete_archive = False
+
+    # Whether Model.objects.get(pk=...) is cached (see softdelete.caching).
+    soft_delete_cache = False
+
+    # Foreign keys to count live and deleted rows per parent by, or None
+    # to maintain no counters (see softdelete.counters).
+    soft_delete_counters = None
+
+    # Whether to index (deleted_at, pk) of the soft-deleted rows, for
+    # deleted_between and deleted_since (see softdelete.indexes).
+    soft_delete_history = False
+
     class Meta:
         abstract = True
         
@@ -113,72 +553,610 @@ class SoftDeleteObject(models.Model):
         """Called via the admin interface (if user checks the
         "deleted" checkox).
         """
-        self.__dirty = True 
+        if bool(d) != self.deleted and not self.__dirty:
+            # What save() stores before soft_delete/undelete flip it.
+            self.__stored_deleted_at = self.deleted_at
         if d and not self.deleted_at:
+            self.__dirty = True
             self.deleted_at = datetime.utcnow()
         elif not d and self.deleted_at:
+            self.__dirty = True
             self.deleted_at = None
 
     deleted = property(get_deleted, set_deleted)
 
-    def _do_soft_delete(self, related, using, do_related):
-        rel = related.get_accessor_name()
-        try:
-            getattr(self, rel).all().soft_delete(using=using, do_related=do_related)
-        except (AttributeError, ObjectDoesNotExist):
-            # getattr(self, rel).__class__.objects.all().soft_delete()
-            pass
-
     def soft_delete(self, *args, **kwargs):
-        using = kwargs.get('using', settings.DATABASES['default'])
+        """Soft-deletes the object and, unless ``do_related=False``, the
+        objects referencing it.
+
+        With ``stream=True`` the related objects are processed in committed
+        chunks before the object itself (see ``StreamingCascade``); calling
+        it again after an interruption resumes the same changeset.
+
+        With ``background=True`` only the object is marked before returning;
+        the cascade is queued as a ``CascadeJob`` for the configured
+        executor (see ``softdelete.executors``).
+
+        With ``parallel=True`` the models of each level of the cascade are
+        updated concurrently (see ``ParallelCascade``).
+        """
+        using = kwargs.get('using') or router.db_for_write(self.__class__,
+                                                           instance=self)
         do_related = kwargs.pop('do_related', True)
-        pre_soft_delete.send(sender=self.__class__,
-                             instance=self,
-                             using=using)
-        logging.debug('SOFT DELETING type: %s, %s' % (type(self), self))
-        self.deleted_at = datetime.today()
-        self.save()
-        if do_related:
-            for related in self._meta.get_all_related_objects():
-                self._do_soft_delete(related, using, do_related)
-        logging.debug("FINISHED SOFT DELETING RELATED %s" % self)
-        post_soft_delete.send(sender=self.__class__,
-                              instance=self,
-                              using=using)
+        background = kwargs.pop('background', False) and do_related and \
+                     has_integer_pk(self.__class__)
+        stream = kwargs.pop('stream', False) and not background
+        cascade = cascade_class(kwargs.pop('parallel', False))(using=using)
+        with measure('soft_delete', self.__class__, using):
+            pre_soft_delete.send(sender=self.__class__,
+                                 instance=self,
+                                 using=using)
+            logging.debug('SOFT DELETING type: %s, %s', type(self), self)
+            deleted_at = datetime.today()
+            changesets = ChangeSet.objects.db_manager(using)
+            job = None
+            if stream:
+                with cascade_transaction(using):
+                    changeset = changesets.start(self.__class__, self.pk,
+                                                 resume=True)
+                if do_related:
+                    StreamingCascade(
+                        using=using, changeset=changeset).soft_delete(
+                        self.__class__, [self.pk], deleted_at=deleted_at)
+            with cascade.transaction(self.__class__):
+                self.deleted_at = deleted_at
+                changed = record = self.save_deleted_at(using)
+                if not stream:
+                    changeset = None
+                    if not changed and do_related:
+                        # An object that was already deleted keeps the
+                        # changeset undelete restores for it, so that the
+                        # objects marked on this pass are recorded there.
+                        latest = list(changesets.for_objects(
+                            self.__class__, [self.pk])[:1])
+                        changeset = latest and latest[0] or None
+                    if changeset is None and (changed or do_related):
+                        changeset = changesets.start(self.__class__, self.pk)
+                        record = True
+                if changeset is not None and record:
+                    changeset.record(self.__class__, [self.pk])
+                if background:
+                    job = CascadeJob.objects.db_manager(using).enqueue(
+                        CascadeJob.SOFT_DELETE, self.__class__, [self.pk],
+                        changeset=changeset, deleted_at=deleted_at)
+                elif do_related and not stream:
+                    cascade.changeset = changeset
+                    cascade.soft_delete(self.__class__, [self.pk],
+                                        deleted_at=deleted_at)
+            if job is not None:
+                get_executor().submit(job)
+            logging.debug("FINISHED SOFT DELETING RELATED %s", self)
+            post_soft_delete.send(sender=self.__class__,
+                                  instance=self,
+                                  using=using)
 
-    def _do_undelete(self, related, using, do_related):
-        rel = related.get_accessor_name()
-        try:
-            getattr(self, rel).soft_deleted_set().undelete(using=using, do_related=do_related)
-        except AttributeError:
-            # getattr(self, rel).__class__.objects.all().soft_delete()
-            pass
+    def soft_delete_plan(self, using=None, do_related=True, estimate=False):
+        """Returns the ``SoftDeletePlan`` of ``soft_delete`` without
+        marking anything (see ``softdelete.plan``).
+        """
+        using = using or router.db_for_write(self.__class__, instance=self)
+        return soft_delete_plan(
+            self.__class__._base_manager.using(using).filter(pk=self.pk),
+            using, do_related, estimate)
 
     def undelete(self, *args, **kwargs):
-        logging.debug('UNDELETING %s' % self)
-        using = kwargs.get('using', settings.DATABASES['default'])
+        """Undeletes the object together with its changesets, or with the
+        objects referencing it when it has none.  ``stream=True``,
+        ``background=True`` and ``parallel=True`` work as for
+        ``soft_delete``.
+        """
+        logging.debug('UNDELETING %s', self)
+        using = kwargs.get('using') or router.db_for_write(self.__class__,
+                                                           instance=self)
         do_related = kwargs.pop('do_related', True)
-        pre_undelete.send(sender=self.__class__,
-                          instance=self,
-                          using=using)
-        self.deleted_at = None
-        self.save()
-        if do_related:
-            for related in self._meta.get_all_related_objects():
-                try:
-                    self._do_undelete(related, using, do_related)
-                except AttributeError:
-                    raise
-        post_undelete.send(sender=self.__class__,
-                           instance=self,
-                           using=using)
-        logging.debug('FINISHED UNDELETING RELATED %s' % self)
+        background = kwargs.pop('background', False) and do_related and \
+                     has_integer_pk(self.__class__)
+        stream = kwargs.pop('stream', False) and not background
+        cascade = cascade_class(kwargs.pop('parallel', False))(using=using)
+        with measure('undelete', self.__class__, using):
+            jobs = []
+            pre_undelete.send(sender=self.__class__,
+                              instance=self,
+                              using=using)
+            changesets = []
+            if do_related and not background:
+                changesets = list(ChangeSet.objects.db_manager(
+                    using).for_objects(self.__class__, [self.pk]))
+            if stream:
+                for changeset in changesets:
+                    changeset.restore(stream=True)
+                if do_related and not changesets:
+                    StreamingCascade(using=using).undelete(self.__class__,
+                                                           [self.pk])
+            with cascade.transaction(self.__class__):
+                self.deleted_at = None
+                self.save_deleted_at(using)
+                if background:
+                    jobs = CascadeJob.objects.db_manager(
+                        using).enqueue_undelete(self.__class__, [self.pk])
+                elif not stream:
+                    for changeset in changesets:
+                        changeset.restore()
+                    if do_related and not changesets:
+                        cascade.undelete(self.__class__, [self.pk])
+            for job in jobs:
+                get_executor().submit(job)
+            post_undelete.send(sender=self.__class__,
+                               instance=self,
+                               using=using)
+            logging.debug('FINISHED UNDELETING RELATED %s', self)
+
+    def save_deleted_at(self, using):
+        """Writes ``deleted_at`` alone with a single ``UPDATE``, leaving
+        the other columns (and concurrent edits to them) untouched.  Falls
+        back to a full save for objects not stored yet.  Returns whether
+        the object changed state, i.e. was not already (un)deleted.
+        """
+        self.__dirty = False
+        if self.pk is not None:
+            deleted = self.deleted_at is not None
+            if is_archived(self.__class__):
+                updated = changed = move(self.__class__, [self.pk], using,
+                                         self.deleted_at)
+                if not updated and deleted:
+                    updated = save_archived(self, using)
+            else:
+                qs = self.__class__._base_manager.using(using).filter(
+                    pk=self.pk)
+                updated = changed = qs.filter(
+                    deleted_at__isnull=deleted).update(
+                    deleted_at=self.deleted_at)
+                if not changed:
+                    updated = qs.update(deleted_at=self.deleted_at)
+            count(self.__class__, updated)
+            invalidate(self.__class__, [self.pk])
+            if changed:
+                state_changed(self.__class__, using, 1, deleted,
+                              instance_parents(self))
+            if updated:
+                self._state.db = using
+                return bool(changed)
+        super(SoftDeleteObject, self).save(using=using)
+        return True
+
+    def _save_archived(self, using):
+        """Saves the object to its archive row if that is where it is
+        stored, i.e. if it is soft-deleted.
+        """
+        if self.pk is None or not is_archived(self.__class__) or \
+               self.deleted_at is None:
+            return False
+        using = using or router.db_for_write(self.__class__, instance=self)
+        if not save_archived(self, using):
+            return False
+        invalidate(self.__class__, [self.pk])
+        self._state.db = using
+        return True
+
+    def delete(self, using=None):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        if is_archived(self.__class__) and self.deleted_at is not None:
+            # The row is in the archive table.
+            with cascade_transaction(using):
+                delete_archived([self], using)
+            return
+        super(SoftDeleteObject, self).delete(using=using)
 
     def save(self, **kwargs):
-        super(SoftDeleteObject, self).save(**kwargs)
+        deleted_at = self.deleted_at
+        if self.__dirty:
+            # The row keeps its state until soft_delete/undelete below
+            # change it, together with the changeset and counters.
+            self.deleted_at = self.__stored_deleted_at
+        try:
+            if not self._save_archived(kwargs.get('using')):
+                super(SoftDeleteObject, self).save(**kwargs)
+        finally:
+            self.deleted_at = deleted_at
         if self.__dirty:
             self.__dirty = False
             if not self.deleted:
-                self.undelete()
+                self.undelete(using=kwargs.get('using'))
             else:
-                self.soft_delete()
+                self.soft_delete(using=kwargs.get('using'))
+
+
+def pack_pks(pks):
+    """Packs integer primary keys into ranges, e.g. ``[1, 2, 3, 7, 9, 10]``
+    becomes ``'1-3,7,9-10'``.
+    """
+    ranges = []
+    for pk in sorted(set(int(pk) for pk in pks)):
+        if ranges and ranges[-1][1] == pk - 1:
+            ranges[-1][1] = pk
+        else:
+            ranges.append([pk, pk])
+    return ','.join([start == end and str(start) or '%d-%d' % (start, end)
+                     for start, end in ranges])
+
+
+def unpack_pks(packed):
+    for part in packed.split(','):
+        if part:
+            start, sep, end = part.partition('-')
+            for pk in xrange(int(start), int(end or start) + 1):
+                yield pk
+
+
+def count_pks(packed):
+    """Returns the number of keys packed by ``pack_pks``."""
+    count = 0
+    for part in packed.split(','):
+        if part:
+            start, sep, end = part.partition('-')
+            count += int(end or start) - int(start) + 1
+    return count
+
+
+def intersect_pks(packed, pks):
+    """Returns the keys of the sorted list ``pks`` that fall in the ranges
+    packed by ``pack_pks``, without unpacking the ranges.
+    """
+    covered = set()
+    for part in packed.split(','):
+        if part:
+            start, sep, end = part.partition('-')
+            covered.update(pks[bisect_left(pks, int(start)):
+                               bisect_right(pks, int(end or start))])
+    return covered
+
+
+class ChangeSetManager(models.Manager):
+    def start(self, model, object_id=None, resume=False):
+        """Creates the changeset of a soft-delete starting at ``model``
+        (and at the object ``object_id`` of it, if there is a single root).
+        Returns None when changesets are disabled or cannot record every
+        model the cascade can reach.
+
+        With ``resume``, the latest changeset of the same root is returned
+        instead if there is one, so that a streamed cascade that was
+        interrupted keeps recording in it.
+        """
+        if not getattr(settings, 'SOFTDELETE_CHANGESETS', True):
+            return None
+        if not cascade_plan(model).tracks_changesets():
+            return None
+        content_type = ContentType.objects.db_manager(
+            self.db).get_for_model(model)
+        if resume and object_id is not None:
+            changesets = self.filter(content_type=content_type,
+                                     object_id=object_id).order_by('-pk')[:1]
+            if changesets:
+                return changesets[0]
+        return self.create(content_type=content_type, object_id=object_id)
+
+    def covering(self, model, pks):
+        """Maps the keys of the changesets that soft-deleted any of ``pks``
+        to the keys they cover.
+        """
+        if not pks or not has_integer_pk(model):
+            return {}
+        pks = sorted(set(int(pk) for pk in pks))
+        content_type = ContentType.objects.db_manager(
+            self.db).get_for_model(model)
+        records = SoftDeleteRecord.objects.using(self.db).filter(
+            content_type=content_type,
+            min_pk__lte=pks[-1],
+            max_pk__gte=pks[0]).values_list('changeset', 'object_ids')
+        covering = {}
+        for changeset, packed in records:
+            covered = intersect_pks(packed, pks)
+            if covered:
+                covering.setdefault(changeset, set()).update(covered)
+        return covering
+
+    def restore_counts(self, model, pks):
+        """Returns the number of rows of each model that restoring the
+        changesets covering ``pks`` undeletes, and the keys of ``pks`` that
+        none of them covers.
+        """
+        covering = self.covering(model, pks)
+        records = SoftDeleteRecord.objects.using(self.db).filter(
+            changeset__in=covering.keys()).values_list('content_type',
+                                                       'object_ids')
+        counts = {}
+        for content_type, packed in records:
+            record_model = ContentType.objects.db_manager(
+                self.db).get_for_id(content_type).model_class()
+            counts[record_model] = counts.get(record_model, 0) + \
+                                   count_pks(packed)
+        covered = set()
+        for changeset_pks in covering.values():
+            covered.update(changeset_pks)
+        return counts, [pk for pk in pks if int(pk) not in covered]
+
+    def for_objects(self, model, pks):
+        """Returns the changesets that soft-deleted any of ``pks``, most
+        recent first.
+        """
+        return self.filter(pk__in=self.covering(model, pks).keys()).order_by(
+            '-created_date', '-pk')
+
+
+class ChangeSet(models.Model):
+    """Everything a single soft-delete cascade marked as deleted.
+
+    Undeleting any object of a changeset restores the whole changeset,
+    with one ``UPDATE`` per model, and then removes it.
+    """
+    created_date = models.DateTimeField(default=datetime.utcnow)
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField(blank=True, null=True)
+
+    objects = ChangeSetManager()
+
+    def record(self, model, pks):
+        if not pks:
+            return
+        content_type = ContentType.objects.db_manager(
+            self._state.db).get_for_model(model)
+        SoftDeleteRecord.objects.using(self._state.db).create(
+            changeset=self, content_type=content_type,
+            min_pk=min(pks), max_pk=max(pks), object_ids=pack_pks(pks))
+
+    def restore(self, send_signals=True, stream=False):
+        """Undeletes every row of the changeset, then removes it.
+
+        With ``stream=True`` records are restored and removed one at a
+        time, each in its own transaction, so an interrupted restore can
+        be resumed by calling it again.
+        """
+        with measure('restore', self._model(self.content_type_id),
+                     self._state.db):
+            self._restore(send_signals, stream)
+
+    def _restore(self, send_signals, stream):
+        using = self._state.db
+        root = self._model(self.content_type_id)
+        cascades = {}
+        records = self.soft_delete_records.order_by('pk').values_list(
+            'pk', 'content_type', 'object_ids')
+        if stream:
+            while True:
+                with cascade_transaction(using):
+                    batch = list(records[:1])
+                    if not batch:
+                        break
+                    pk, content_type, packed = batch[0]
+                    model = self._model(content_type)
+                    cascade = self._cascade(cascades, root, model,
+                                            send_signals)
+                    with cascade_transaction(cascade.using):
+                        cascade.undelete(model, list(unpack_pks(packed)),
+                                         include_root=True, related=False)
+                    SoftDeleteRecord.objects.using(using).filter(
+                        pk=pk).delete()
+            with cascade_transaction(using):
+                self.delete()
+            return
+        pks = {}
+        for pk, content_type, packed in records:
+            pks.setdefault(content_type, set()).update(unpack_pks(packed))
+        with cascade_transactions(cascade_aliases(root, using)):
+            for content_type, model_pks in pks.items():
+                model = self._model(content_type)
+                self._cascade(cascades, root, model, send_signals).undelete(
+                    model, sorted(model_pks), include_root=True,
+                    related=False)
+            self.delete()
+
+    def _cascade(self, cascades, root, model, send_signals):
+        """Returns the cascade restoring the rows of ``model``, on the
+        database of the changeset for its root model and on the one picked
+        by the routers for the others.
+        """
+        using = self._state.db
+        if model is not root:
+            using = db_for_model(model, using)
+        if using not in cascades:
+            cascades[using] = SoftDeleteCascade(using=using,
+                                                send_signals=send_signals)
+        return cascades[using]
+
+    def _model(self, content_type_id):
+        return ContentType.objects.db_manager(self._state.db).get_for_id(
+            content_type_id).model_class()
+
+
+class SoftDeleteRecord(models.Model):
+    """Primary keys of one model soft-deleted by a changeset, packed as
+    ranges by ``pack_pks``.  A cascade writes one record per model per
+    chunk of keys.
+
+    Records are looked up by ``(content_type, min_pk, max_pk)``; the index
+    on these columns is created by ``syncdb`` and by migration 0006.
+    """
+    changeset = models.ForeignKey(ChangeSet,
+                                  related_name='soft_delete_records')
+    created_date = models.DateTimeField(default=datetime.utcnow)
+    content_type = models.ForeignKey(ContentType)
+    min_pk = models.IntegerField()
+    max_pk = models.IntegerField()
+    object_ids = models.TextField()
+
+
+class CascadeJobManager(models.Manager):
+    def enqueue(self, action, model, pks, changeset=None, deleted_at=None,
+                send_signals=True):
+        content_type = ContentType.objects.db_manager(
+            self.db).get_for_model(model)
+        return self.create(action=action, content_type=content_type,
+                           object_ids=pack_pks(pks),
+                           changeset_id=changeset and changeset.pk or None,
+                           deleted_at=deleted_at, send_signals=send_signals)
+
+    def enqueue_undelete(self, model, pks, send_signals=True):
+        """Queues the undelete cascade of ``pks``: one job per changeset
+        covering some of them, and one for the keys none covers.
+        """
+        covering = ChangeSet.objects.db_manager(self.db).covering(model, pks)
+        jobs = []
+        covered = set()
+        for changeset_id, changeset_pks in covering.items():
+            jobs.append(self.create(
+                action=CascadeJob.UNDELETE, changeset_id=changeset_id,
+                content_type=ContentType.objects.db_manager(
+                    self.db).get_for_model(model),
+                object_ids=pack_pks(changeset_pks),
+                send_signals=send_signals))
+            covered.update(changeset_pks)
+        uncovered = [pk for pk in pks if pk not in covered]
+        if uncovered:
+            jobs.append(self.enqueue(CascadeJob.UNDELETE, model, uncovered,
+                                     send_signals=send_signals))
+        return jobs
+
+    def claim(self, pk):
+        """Marks the pending job ``pk`` as running and returns it, or
+        returns None if it is not pending (anymore).
+        """
+        if self.filter(pk=pk, status=CascadeJob.PENDING).update(
+                status=CascadeJob.RUNNING, started_date=datetime.utcnow()):
+            return self.get(pk=pk)
+        return None
+
+    def claim_next(self):
+        for pk in self.filter(status=CascadeJob.PENDING).order_by(
+                'pk').values_list('pk', flat=True)[:10]:
+            job = self.claim(pk)
+            if job is not None:
+                return job
+        return None
+
+    def status(self, changeset_id):
+        """Returns the status of the latest job of the changeset
+        ``changeset_id``, or None if it has none.
+        """
+        statuses = self.filter(changeset_id=changeset_id).order_by(
+            '-pk').values_list('status', flat=True)[:1]
+        return statuses and statuses[0] or None
+
+
+class CascadeJob(models.Model):
+    """A cascade queued by ``soft_delete``/``undelete`` with
+    ``background=True``, for the objects ``object_ids`` (packed as by
+    ``pack_pks``) that were already marked.
+    """
+    SOFT_DELETE = 'soft_delete'
+    UNDELETE = 'undelete'
+    ACTIONS = ((SOFT_DELETE, 'Soft delete'), (UNDELETE, 'Undelete'))
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = ((PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'),
+                (FAILED, 'Failed'))
+
+    action = models.CharField(max_length=16, choices=ACTIONS)
+    status = models.CharField(max_length=16, choices=STATUSES,
+                              default=PENDING, db_index=True)
+    changeset_id = models.PositiveIntegerField(blank=True, null=True,
+                                               db_index=True)
+    content_type = models.ForeignKey(ContentType)
+    object_ids = models.TextField()
+    deleted_at = models.DateTimeField(blank=True, null=True)
+    send_signals = models.BooleanField(default=True)
+    created_date = models.DateTimeField(default=datetime.utcnow)
+    started_date = models.DateTimeField(blank=True, null=True)
+    finished_date = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    objects = CascadeJobManager()
+
+    def run(self):
+        using = self._state.db
+        model = ContentType.objects.db_manager(using).get_for_id(
+            self.content_type_id).model_class()
+        pks = list(unpack_pks(self.object_ids))
+        changesets = ChangeSet.objects.using(using).filter(
+            pk=self.changeset_id)
+        try:
+            with measure('cascade_job', model, using):
+                self._run(model, pks, changesets)
+        except Exception:
+            logging.exception('Cascade job %s failed', self.pk)
+            self._finish(self.FAILED, traceback.format_exc())
+        else:
+            self._finish(self.DONE)
+
+    def _run(self, model, pks, changesets):
+        using = self._state.db
+        if self.action == self.SOFT_DELETE:
+            StreamingCascade(
+                using=using, send_signals=self.send_signals,
+                changeset=changesets and changesets[0] or None
+            ).soft_delete(model, pks, deleted_at=self.deleted_at)
+        elif self.changeset_id is not None:
+            for changeset in changesets:
+                changeset.restore(send_signals=self.send_signals,
+                                  stream=True)
+        else:
+            StreamingCascade(using=using, send_signals=self.send_signals
+                             ).undelete(model, pks)
+
+    def _finish(self, status, error=''):
+        self.status = status
+        self.error = error
+        self.finished_date = datetime.utcnow()
+        with cascade_transaction(self._state.db):
+            CascadeJob.objects.using(self._state.db).filter(pk=self.pk).update(
+                status=status, error=error, finished_date=self.finished_date)
+
+
+class SoftDeleteCounterManager(models.Manager):
+    def add(self, content_type, field, parent, live, deleted):
+        """Adds to the counter, creating it if needed."""
+        lookup = {'content_type': content_type, 'field': field,
+                  'parent': unicode(parent)}
+        counters = self.filter(**lookup)
+        if counters.update(live=F('live') + live,
+                           deleted=F('deleted') + deleted):
+            return
+        sid = transaction.savepoint(using=self.db)
+        try:
+            self.create(live=live, deleted=deleted, **lookup)
+            transaction.savepoint_commit(sid, using=self.db)
+        except IntegrityError:
+            # Created concurrently.
+            transaction.savepoint_rollback(sid, using=self.db)
+            counters.update(live=F('live') + live,
+                            deleted=F('deleted') + deleted)
+
+    def counts(self, model, field='', parent=''):
+        """Returns ``(live, deleted)`` for ``model``, or for its rows whose
+        foreign key ``field`` is ``parent``.
+        """
+        content_type = ContentType.objects.db_manager(
+            self.db).get_for_model(model)
+        try:
+            counter = self.get(content_type=content_type, field=field,
+                               parent=unicode(parent))
+        except self.model.DoesNotExist:
+            return 0, 0
+        return counter.live, counter.deleted
+
+
+class SoftDeleteCounter(models.Model):
+    """Live and soft-deleted rows of a model, or of its rows whose foreign
+    key ``field`` holds ``parent``, kept by ``softdelete.counters``.
+    """
+    content_type = models.ForeignKey(ContentType)
+    field = models.CharField(max_length=100, blank=True)
+    parent = models.CharField(max_length=255, blank=True)
+    live = models.BigIntegerField(default=0)
+    deleted = models.BigIntegerField(default=0)
+
+    objects = SoftDeleteCounterManager()
+
+    class Meta:
+        unique_together = (('content_type', 'field', 'parent'),)
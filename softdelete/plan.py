@@ -0,0 +1,130 @@
+"""Dry runs of soft-delete cascades.
+
+``obj.soft_delete_plan()`` and ``queryset.soft_delete_plan()`` walk the
+relation graph a ``soft_delete`` would, but only count rows (see
+``SoftDeleteCascade.count``): one ``COUNT`` per model and level, or with
+``estimate=True`` one ``EXPLAIN`` on PostgreSQL.  The returned
+``SoftDeletePlan`` reports the rows per model and level, the number of
+queries the cascade would issue and, on PostgreSQL, the planner's cost of
+reading those rows, e.g. to refuse or defer large cascades::
+
+    plan = account.soft_delete_plan()
+    if plan.total_rows() > 100000:
+        raise ValidationError('%d rows would be deleted' % plan.total_rows())
+    account.soft_delete(background=plan.suggested_mode() != 'sync')
+"""
+import math
+import re
+from django.conf import settings
+from django.db import connections
+from softdelete.cascade import SoftDeleteCascade, cascade_plan
+
+
+def explain(queryset):
+    """Returns the planner's ``(rows, cost)`` estimate for ``queryset`` on
+    PostgreSQL, or None elsewhere.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN ' + sql, params)
+    match = re.search(r'cost=[\d.]+\.\.([\d.]+) rows=(\d+)',
+                      cursor.fetchone()[0])
+    if match is None:
+        return None
+    return int(match.group(2)), float(match.group(1))
+
+
+def estimate_count(queryset):
+    """Returns the planner's estimate of the rows of ``queryset`` on
+    PostgreSQL, or None elsewhere.
+    """
+    estimate = explain(queryset)
+    return estimate and estimate[0] or None
+
+
+class SoftDeletePlan(object):
+    """The rows a soft-delete would mark: ``levels`` lists
+    ``(depth, model, rows)``; ``cost`` is the sum of the planner's costs,
+    or None when it is not known.  ``cycles`` are the models on a cycle of
+    relations; the counts are only ``exact`` when no row can be reached
+    through several paths.
+    """
+    def __init__(self, model, using, levels, queries, cost=None,
+                 cycles=(), exact=True):
+        self.model = model
+        self.using = using
+        self.levels = levels
+        self.queries = queries
+        self.cost = cost
+        self.cycles = cycles
+        self.exact = exact
+
+    def rows(self):
+        """Returns the number of rows per model."""
+        totals = {}
+        for depth, model, rows in self.levels:
+            totals[model] = totals.get(model, 0) + rows
+        return totals
+
+    def total_rows(self):
+        return sum([rows for depth, model, rows in self.levels])
+
+    def depth(self):
+        return max([0] + [depth for depth, model, rows in self.levels])
+
+    def suggested_mode(self):
+        """Returns ``'background'`` for cascades over
+        ``SOFTDELETE_BACKGROUND_THRESHOLD`` rows (1000 by default),
+        ``'stream'`` for those over ``SOFTDELETE_STREAM_THRESHOLD`` rows
+        (100000 by default) and ``'sync'`` otherwise.
+        """
+        rows = self.total_rows()
+        if rows > getattr(settings, 'SOFTDELETE_STREAM_THRESHOLD', 100000):
+            return 'stream'
+        if rows > getattr(settings, 'SOFTDELETE_BACKGROUND_THRESHOLD', 1000):
+            return 'background'
+        return 'sync'
+
+    def __repr__(self):
+        return '<SoftDeletePlan %s: %d rows, %d models, %d queries>' % (
+            self.model.__name__, self.total_rows(), len(self.rows()),
+            self.queries)
+
+
+def soft_delete_plan(queryset, using, do_related=True, estimate=False,
+                     overhead=1):
+    """Returns the ``SoftDeletePlan`` of soft-deleting ``queryset`` on
+    ``using``; ``overhead`` is the number of queries issued besides the
+    cascade itself.
+    """
+    cascade = SoftDeleteCascade(using=using)
+    costs = []
+
+    def counter(qs):
+        estimated = explain(qs)
+        if estimated is None:
+            return qs.count()
+        costs.append(estimated[1])
+        if estimate:
+            return estimated[0]
+        return qs.count()
+    max_depth = None
+    if not do_related:
+        max_depth = 0
+    levels = cascade.count(queryset, max_depth=max_depth, counter=counter)
+    # Per chunk of each model: one UPDATE, one changeset record and one
+    # query per relation collecting the next level.
+    queries = overhead
+    for depth, model, rows in levels:
+        chunks = int(math.ceil(rows / float(cascade.chunk_size)))
+        queries += chunks * 2
+        if do_related:
+            queries += chunks * len(cascade.relations(model))
+    plan = cascade_plan(queryset.model)
+    return SoftDeletePlan(queryset.model, using, levels, queries,
+                          costs and sum(costs) or None, plan.cycles(),
+                          not (do_related and (plan.shared_models() or
+                                               plan.cycles())))
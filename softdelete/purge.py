@@ -0,0 +1,242 @@
+"""Hard deletion of the soft-deleted rows kept past their retention.
+
+A model opts in with a ``soft_delete_retention`` timedelta::
+
+    class Comment(SoftDeleteObject):
+        soft_delete_retention = timedelta(days=90)
+
+``Purge`` deletes the rows soft-deleted longer ago than that, model by
+model, children first, in chunks of keys read in primary key order: each
+chunk is one ``DELETE`` over its key range, committed on its own, so that
+locks stay short and an interrupted purge resumes where it stopped when
+run again.  Rows still referenced by other rows are skipped; the rows
+linking them through auto-created many-to-many tables are deleted along.
+The changeset records older than the retention go too, and so do the
+rows of archived models (see ``softdelete.archive``) from their archive.
+
+``manage.py softdelete_purge`` runs it.
+"""
+from datetime import datetime
+import time
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models, DEFAULT_DB_ALIAS
+from softdelete.archive import archive_table, base_queryset, is_archived
+from softdelete.caching import invalidate
+from softdelete.cascade import cascade_transaction
+from softdelete.counters import is_counted, parent_counts, update_counters
+from softdelete.instrumentation import count, measure
+
+
+class PurgeResult(object):
+    def __init__(self, model, cutoff):
+        self.model = model
+        self.cutoff = cutoff
+        self.deleted = 0
+        self.skipped = 0
+        self.records = 0
+        self.last_pk = None
+
+    def __repr__(self):
+        return '<PurgeResult %s: %d deleted, %d skipped, %d records>' % (
+            self.model.__name__, self.deleted, self.skipped, self.records)
+
+
+def purgeable_models(app_labels=()):
+    """The soft-delete models with a retention, children first."""
+    from softdelete.models import SoftDeleteObject
+    if app_labels:
+        candidates = []
+        for label in app_labels:
+            if '.' in label:
+                candidates.append(models.get_model(*label.split('.', 1)))
+            else:
+                candidates.extend(models.get_models(models.get_app(label)))
+    else:
+        candidates = models.get_models()
+    return purge_order([model for model in candidates
+                        if model is not None and
+                        issubclass(model, SoftDeleteObject) and
+                        model.soft_delete_retention is not None])
+
+
+def _references(model, other):
+    return [f for f in model._meta.fields if f.rel and f.rel.to is other]
+
+
+def purge_order(models):
+    """Sorts ``models`` so that every model comes before the models it
+    references; models referencing each other keep their order.
+    """
+    remaining = sorted(models, key=lambda m: m._meta.db_table)
+    ordered = []
+    while remaining:
+        for model in remaining:
+            if not [other for other in remaining if other is not model and
+                    _references(other, model)]:
+                break
+        else:
+            model = remaining[0]
+        remaining.remove(model)
+        ordered.append(model)
+    return ordered
+
+
+class Purge(object):
+    def __init__(self, using=DEFAULT_DB_ALIAS, chunk_size=None, sleep=0,
+                 dry_run=False, now=None, progress=None):
+        self.using = using
+        self.chunk_size = chunk_size or getattr(
+            settings, 'SOFTDELETE_CHUNK_SIZE', 500)
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.now = now or datetime.now()
+        self.progress = progress
+
+    def run(self, models=None):
+        if models is None:
+            models = purgeable_models()
+        return [self.purge(model) for model in models]
+
+    def expired(self, model):
+        cutoff = self.now - model.soft_delete_retention
+        return cutoff, base_queryset(model, self.using, deleted=True).filter(
+            deleted_at__lt=cutoff)
+
+    def purge(self, model):
+        """Deletes the expired rows of ``model``; only counts them with
+        ``dry_run``.
+        """
+        cutoff, qs = self.expired(model)
+        result = PurgeResult(model, cutoff)
+        with measure('purge', model, self.using):
+            if self.dry_run:
+                result.deleted = qs.count()
+                return result
+            while self._pass(model, qs.order_by('pk'), result):
+                pass
+            self._purge_records(model, cutoff, result)
+        return result
+
+    def _pass(self, model, qs, result):
+        """Runs through the expired rows once.  Returns whether to run
+        again, for rows of a model referencing itself that were skipped
+        until the rows referencing them were gone.
+        """
+        self_referencing = bool(_references(model, model))
+        deleted, skipped, last = 0, 0, None
+        while True:
+            page = qs
+            if last is not None:
+                page = qs.filter(pk__gt=last)
+            pks = list(page.values_list('pk', flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            last = result.last_pk = pks[-1]
+            referenced = self.referenced(model, pks)
+            with cascade_transaction(self.using):
+                if referenced:
+                    pks = [pk for pk in pks if pk not in referenced]
+                    chunk = qs.filter(pk__in=pks)
+                else:
+                    chunk = qs.filter(pk__gte=pks[0], pk__lte=pks[-1])
+                parents = ()
+                if is_counted(model) and pks:
+                    parents = parent_counts(model, chunk)
+                if referenced:
+                    rows = self.delete(model, result.cutoff, pks=pks)
+                else:
+                    rows = self.delete(model, result.cutoff,
+                                       first=pks[0], last=pks[-1])
+                invalidate(model, pks)
+                update_counters(model, self.using, rows, 0, -1, parents)
+            deleted += rows
+            skipped += len(referenced)
+            result.deleted += rows
+            if self.progress is not None:
+                self.progress(result)
+            if self.sleep:
+                time.sleep(self.sleep)
+        result.skipped = skipped
+        return self_referencing and deleted and skipped
+
+    def referenced(self, model, pks):
+        """Returns the keys among ``pks`` of the rows referenced by other
+        rows, auto-created many-to-many links aside.
+        """
+        referenced = set()
+        for related in model._meta.get_all_related_objects(
+                include_hidden=True):
+            if related.model._meta.auto_created:
+                continue
+            field = related.field
+            for deleted in set([False, is_archived(related.model)]):
+                referenced.update(base_queryset(
+                    related.model, self.using, deleted).filter(
+                    **{'%s__in' % field.name: pks}).values_list(
+                    field.attname, flat=True))
+        return referenced
+
+    def delete(self, model, cutoff, pks=None, first=None, last=None):
+        """Deletes the rows of ``model`` among ``pks``, or with a key
+        between ``first`` and ``last``, still soft-deleted before
+        ``cutoff``, with their auto-created many-to-many links.  Returns
+        the number of rows deleted.
+        """
+        if pks is not None and not pks:
+            return 0
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        opts = model._meta
+        table = opts.db_table
+        if is_archived(model):
+            table = archive_table(model)
+        pk = qn(opts.pk.column)
+        if pks is not None:
+            where = '%s IN (%s)' % (pk, ', '.join(['%s'] * len(pks)))
+            params = list(pks)
+        else:
+            where = '%s >= %%s AND %s <= %%s' % (pk, pk)
+            params = [first, last]
+        where = '%s AND %s < %%s' % (where, qn('deleted_at'))
+        params.append(connection.ops.value_to_db_datetime(cutoff))
+        cursor = connection.cursor()
+        for related in opts.get_all_related_objects(include_hidden=True):
+            if related.model._meta.auto_created:
+                cursor.execute(
+                    'DELETE FROM %s WHERE %s IN (SELECT %s FROM %s WHERE %s)'
+                    % (qn(related.model._meta.db_table),
+                       qn(related.field.column), pk, qn(table), where),
+                    params)
+        cursor.execute('DELETE FROM %s WHERE %s' % (qn(table), where), params)
+        count(model, cursor.rowcount)
+        return cursor.rowcount
+
+    def _purge_records(self, model, cutoff, result):
+        """Deletes the changeset records of ``model`` older than
+        ``cutoff``, then its changesets left without records.
+        """
+        from softdelete.models import ChangeSet, SoftDeleteRecord
+        content_type = ContentType.objects.db_manager(
+            self.using).get_for_model(model)
+        for manager, lookup in (
+                (SoftDeleteRecord._base_manager, {}),
+                (ChangeSet._base_manager,
+                 {'soft_delete_records__isnull': True})):
+            qs = manager.using(self.using).filter(
+                content_type=content_type, created_date__lt=cutoff,
+                **lookup)
+            while True:
+                pks = list(qs.values_list('pk', flat=True)[:self.chunk_size])
+                if not pks:
+                    break
+                connection = connections[self.using]
+                qn = connection.ops.quote_name
+                with cascade_transaction(self.using):
+                    cursor = connection.cursor()
+                    cursor.execute('DELETE FROM %s WHERE %s IN (%s)' % (
+                        qn(manager.model._meta.db_table),
+                        qn(manager.model._meta.pk.column),
+                        ', '.join(['%s'] * len(pks))), pks)
+                if manager.model is SoftDeleteRecord:
+                    result.records += cursor.rowcount
@@ -0,0 +1,118 @@
+"""Prefetching of the related objects of soft-delete querysets.
+
+``SoftDeleteQuerySet.prefetch_live('tmts')`` loads the live ``tmts`` of
+all the objects of the queryset with one query per relation (two for a
+many-to-many relation), filtering ``deleted_at IS NULL`` in SQL on the
+related model and on the intermediate model.  ``obj.tmts.all()`` then
+returns the prefetched objects without a query; any further filtering
+runs a new query as usual.
+"""
+from softdelete.cascade import chunked
+
+
+class PrefetchedDescriptor(object):
+    """Wraps the descriptor of a relation so that the managers it returns
+    serve the objects prefetched for the instance, if any.
+    """
+    def __init__(self, name, descriptor):
+        self.name = name
+        self.descriptor = descriptor
+
+    def __get__(self, instance, instance_type=None):
+        manager = self.descriptor.__get__(instance, instance_type)
+        if instance is None:
+            return manager
+        cache = instance.__dict__.get('_soft_delete_prefetched', {})
+        if self.name in cache:
+            objects = cache[self.name]
+            base = manager.get_query_set
+
+            def get_query_set():
+                qs = base()
+                qs._result_cache = list(objects)
+                return qs
+            manager.get_query_set = get_query_set
+        return manager
+
+    def __set__(self, instance, value):
+        self.descriptor.__set__(instance, value)
+
+
+def _install(model, name):
+    for klass in model.__mro__:
+        descriptor = klass.__dict__.get(name)
+        if descriptor is not None:
+            if not isinstance(descriptor, PrefetchedDescriptor):
+                setattr(klass, name, PrefetchedDescriptor(name, descriptor))
+            return
+    raise AttributeError("%s has no relation named '%s'" % (
+        model.__name__, name))
+
+
+def _relation(model, name):
+    """Returns ``(related model, field, through)`` for the relation
+    ``name`` of ``model``, where ``field`` is the foreign key of the
+    related (or intermediate) model pointing to ``model``.
+    """
+    opts = model._meta
+    for related in opts.get_all_related_objects():
+        if related.get_accessor_name() == name:
+            return related.model, related.field, None
+    for field in opts.many_to_many:
+        if field.name == name:
+            through = field.rel.through
+            return (field.rel.to, through._meta.get_field(
+                field.m2m_field_name()), through._meta.get_field(
+                field.m2m_reverse_field_name()))
+    for related in opts.get_all_related_many_to_many_objects():
+        if related.get_accessor_name() == name:
+            through = related.field.rel.through
+            return (related.model, through._meta.get_field(
+                related.field.m2m_reverse_field_name()),
+                through._meta.get_field(related.field.m2m_field_name()))
+    raise AttributeError("%s has no relation named '%s'" % (
+        model.__name__, name))
+
+
+def _live(manager, with_deleted):
+    from softdelete.models import SoftDeleteObject
+    if with_deleted or not issubclass(manager.model, SoftDeleteObject):
+        return manager.all()
+    return manager.filter(deleted_at__isnull=True)
+
+
+def prefetch(instances, name, with_deleted=False, using=None,
+             chunk_size=500):
+    """Loads the objects related to ``instances`` through ``name``, the
+    live ones only unless ``with_deleted`` is set, and caches them on the
+    instances.
+    """
+    if not instances:
+        return
+    model = instances[0].__class__
+    related_model, field, target = _relation(model, name)
+    _install(model, name)
+    key = field.rel.get_related_field().attname
+    values = set(getattr(obj, key) for obj in instances)
+    found = {}
+    if target is None:
+        rows = _live(related_model._base_manager.using(using), with_deleted)
+        for chunk in chunked(values, chunk_size):
+            for obj in rows.filter(**{'%s__in' % field.name: chunk}):
+                found.setdefault(getattr(obj, field.attname), []).append(obj)
+    else:
+        links = _live(field.model._base_manager.using(using), with_deleted)
+        targets = {}
+        for chunk in chunked(values, chunk_size):
+            for source, target_pk in links.filter(
+                    **{'%s__in' % field.name: chunk}).values_list(
+                    field.attname, target.attname):
+                targets.setdefault(target_pk, []).append(source)
+        rows = _live(related_model._base_manager.using(using), with_deleted)
+        for chunk in chunked(targets, chunk_size):
+            for obj in rows.filter(pk__in=chunk):
+                for source in targets[obj.pk]:
+                    found.setdefault(source, []).append(obj)
+    for obj in instances:
+        cache = obj.__dict__.setdefault('_soft_delete_prefetched', {})
+        cache[name] = found.get(getattr(obj, key), [])
@@ -5,3 +5,13 @@ post_soft_delete = Signal(providing_args=['instance'])
 pre_undelete = Signal(providing_args=['instance'])
 post_undelete = Signal(providing_args=['instance'])
 
+# Sent by the cascade once per model and set of primary keys it marks,
+# with the model class as sender.
+pre_bulk_soft_delete = Signal(providing_args=['pks', 'using'])
+post_bulk_soft_delete = Signal(providing_args=['pks', 'using'])
+pre_bulk_undelete = Signal(providing_args=['pks', 'using'])
+post_bulk_undelete = Signal(providing_args=['pks', 'using'])
+
+# Sent with the softdelete.instrumentation.Operation of every finished
+# soft-delete operation, with its model class as sender.
+soft_delete_measured = Signal(providing_args=['operation'])
@@ -9,6 +9,8 @@ class TestModelOne(SoftDeleteObject):
 class TestModelTwo(SoftDeleteObject):
     extra_int = models.IntegerField()
     tmo = models.ForeignKey(TestModelOne,related_name='tmts')
+
+    soft_delete_indexes = (('tmo',),)
     
 class TestModelThree(SoftDeleteObject):
     tmos = models.ManyToManyField(TestModelOne, through='TestModelThrough')
@@ -18,8 +20,21 @@ class TestModelThrough(SoftDeleteObject):
     tmo1 = models.ForeignKey(TestModelOne, related_name="left_side")
     tmo3 = models.ForeignKey(TestModelThree, related_name='right_side')
 
+class TestModelTree(SoftDeleteObject):
+    tmo = models.ForeignKey(TestModelOne, related_name='trees',
+                            blank=True, null=True)
+    parent = models.ForeignKey('self', related_name='children',
+                               blank=True, null=True)
+
+class TestModelArchived(SoftDeleteObject):
+    tmo3 = models.ForeignKey(TestModelThree, related_name='archived')
+    extra_int = models.IntegerField(blank=True, null=True)
+
+    soft_delete_archive = True
+
 
 admin.site.register(TestModelOne, SoftDeleteObjectAdmin)
 admin.site.register(TestModelTwo, SoftDeleteObjectAdmin)
 admin.site.register(TestModelThree, SoftDeleteObjectAdmin)
 admin.site.register(TestModelThrough, SoftDeleteObjectAdmin)
+admin.site.register(TestModelTree, SoftDeleteObjectAdmin)
@@ -1,9 +1,45 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import get_cache
 from django.contrib.auth.models import User
+from django.db.models.signals import class_prepared, post_delete
+from StringIO import StringIO
+from datetime import datetime, timedelta
+import threading
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, router
+from django.template.loader import render_to_string
+from softdelete.admin import ApproximateCountPaginator, DeletedFilterSpec, \
+     SoftDeleteObjectInline
+from softdelete.admin.admin import estimate_count
+from softdelete.archive import archive_table, check_archive
+from softdelete.benchmark import Benchmark, SCENARIOS
+from softdelete.caching import SoftDeleteCache, reset_soft_delete_cache
+from softdelete.counters import reconcile
+from softdelete.cascade import ParallelCascade, SoftDeleteCascade, \
+     cascade_aliases, cascade_plan
+from softdelete.indexes import create_history_index, deleted_at_indexes, \
+     drop_live_index, history_index_name, history_index_sql, \
+     live_index_name, live_index_sql
+from softdelete.models import CascadeJob, ChangeSet, SoftDeleteRecord, \
+     intersect_pks, pack_pks, unpack_pks
+from softdelete.purge import Purge, purge_order
 from softdelete.test_softdelete_app.models import TestModelOne, TestModelTwo, \
-     TestModelThree, TestModelThrough
+     TestModelThree, TestModelThrough, TestModelTree, TestModelArchived
 from softdelete.signals import pre_soft_delete, pre_undelete, \
-     post_soft_delete, post_undelete
+     post_soft_delete, post_undelete, pre_bulk_soft_delete, \
+     post_bulk_soft_delete, pre_bulk_undelete, post_bulk_undelete, \
+     soft_delete_measured
+
+SIGNALS = (pre_soft_delete, pre_undelete, post_soft_delete, post_undelete,
+           pre_bulk_soft_delete, post_bulk_soft_delete, pre_bulk_undelete,
+           post_bulk_undelete, soft_delete_measured)
 
 
 class BaseTest(TestCase):
@@ -196,3 +232,1239 @@ class SoftDeleteRelatedFieldLookupsTests(BaseTest):
         t31.delete()
         self.assertRaises(TestModelThree.DoesNotExist,
                           self.tmo1.testmodelthree_set.get, extra_int=100)
+
+
+class NoReceiversTest(BaseTest):
+    """Runs without any soft-delete signal receiver connected, so that
+    query counts do not depend on receivers left by other tests.
+    """
+    def setUp(self):
+        super(NoReceiversTest, self).setUp()
+        self.receivers = [(s, s.receivers) for s in SIGNALS]
+        for signal in SIGNALS:
+            signal.receivers = []
+        for model in (TestModelOne, TestModelTwo, TestModelThree,
+                      TestModelThrough):
+            ContentType.objects.get_for_model(model)
+
+    def tearDown(self):
+        for signal, receivers in self.receivers:
+            signal.receivers = receivers
+        super(NoReceiversTest, self).tearDown()
+
+
+class CascadeTest(NoReceiversTest):
+    def test_cascade_reaches_through_rows(self):
+        self.tmo1.soft_delete()
+        self.assertEquals(0, self.tmo1.left_side.count())
+        self.assertEquals(50, self.tmo1.left_side.all_with_deleted().count())
+        self.assertEquals(50, self.tmo2.left_side.count())
+        self.assertEquals(100, TestModelThree.objects.count())
+
+    def test_cascade_query_count_is_independent_of_rows(self):
+        for x in range(40):
+            TestModelTwo.objects.create(extra_int=x, tmo=self.tmo1)
+        # save (2), one lookup per relation (2), one UPDATE per model (2),
+        # the changeset and one record per model (4)
+        self.assertNumQueries(10, self.tmo1.soft_delete)
+        self.assertEquals(45, self.tmo1.tmts.soft_deleted_set().filter(
+            tmo=self.tmo1).count())
+        self.assertEquals(5, TestModelTwo.objects.count())
+
+    def test_undelete_only_touches_related_rows(self):
+        other = self.tmo2.tmts.all()[0]
+        other.soft_delete()
+        self.tmo1.soft_delete()
+        self.tmo1.undelete()
+        self.assertEquals(9, TestModelTwo.objects.count())
+        self.assertTrue(TestModelTwo.objects.get(pk=other.pk).deleted)
+
+
+class BulkQuerySetTest(NoReceiversTest):
+    def test_bulk_soft_delete(self):
+        qs = TestModelOne.objects.filter(extra_bool=True)
+        # changeset, root pks, then one UPDATE and one record per model and
+        # one lookup per relation
+        self.assertNumQueries(11, qs.soft_delete, bulk=True)
+        self.assertEquals(1, TestModelOne.objects.count())
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertEquals(50, TestModelThrough.objects.count())
+        self.assertTrue(TestModelOne.objects.get(pk=self.tmo1.pk).deleted)
+
+    def test_bulk_undelete(self):
+        TestModelOne.objects.all().soft_delete(bulk=True)
+        self.assertEquals(0, TestModelTwo.objects.count())
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertEquals(2, TestModelOne.objects.count())
+        self.assertEquals(10, TestModelTwo.objects.count())
+        self.assertEquals(100, TestModelThrough.objects.count())
+
+    def test_bulk_without_related(self):
+        qs = TestModelOne.objects.filter(extra_bool=True)
+        self.assertNumQueries(1, qs.soft_delete, bulk=True, do_related=False)
+        self.assertEquals(10, TestModelTwo.objects.count())
+
+    def test_bulk_without_rows_starts_no_changeset(self):
+        qs = TestModelOne.objects.filter(extra_bool=True)
+        qs.soft_delete(bulk=True)
+        qs.soft_delete(bulk=True)
+        TestModelOne.objects.filter(pk=0).soft_delete(bulk=True, stream=True)
+        self.assertEquals(1, ChangeSet.objects.count())
+
+    def test_bulk_signals_are_opt_in(self):
+        calls = []
+        def receiver(sender, instance, **kwargs):
+            calls.append((sender, instance.pk))
+        pre_soft_delete.connect(receiver)
+        TestModelTwo.objects.filter(tmo=self.tmo1).soft_delete(bulk=True)
+        self.assertEquals([], calls)
+        TestModelTwo.objects.filter(tmo=self.tmo2).soft_delete(
+            bulk=True, send_signals=True)
+        self.assertEquals(5, len(calls))
+
+
+class CascadePlanTest(BaseTest):
+    def test_plan_lists_soft_delete_relations(self):
+        plan = cascade_plan(TestModelOne)
+        relations = dict((r.model, r) for r in plan.relations)
+        self.assertEquals(set([TestModelTwo, TestModelThrough,
+                               TestModelTree]), set(relations))
+        self.assertEquals('tmo__in', relations[TestModelTwo].lookup)
+        self.assertEquals([], cascade_plan(TestModelThrough).relations)
+
+    def test_plan_is_cached_until_a_model_is_prepared(self):
+        plan = cascade_plan(TestModelOne)
+        self.assertTrue(plan is cascade_plan(TestModelOne))
+        class_prepared.send(sender=TestModelOne)
+        self.assertFalse(plan is cascade_plan(TestModelOne))
+
+
+class ChangeSetTest(NoReceiversTest):
+    def test_pack_pks(self):
+        self.assertEquals('1-3,7,9-10', pack_pks([9, 1, 3, 2, 10, 7, 2]))
+        self.assertEquals([1, 2, 3, 7, 9, 10], list(unpack_pks('1-3,7,9-10')))
+        self.assertEquals('', pack_pks([]))
+
+    def test_intersect_pks(self):
+        self.assertEquals(set([2, 3, 9]),
+                          intersect_pks('1-3,7,9-10', [0, 2, 3, 5, 9, 11]))
+        self.assertEquals(set(), intersect_pks('1-3', [4, 5]))
+
+    def test_records_are_indexed_by_range(self):
+        cursor = connection.cursor()
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' "
+                       "AND tbl_name = 'softdelete_softdeleterecord'")
+        self.assertTrue([sql for sql, in cursor.fetchall() if sql and
+                         '"content_type_id", "min_pk", "max_pk"' in sql])
+
+    def test_soft_delete_records_changeset(self):
+        self.tmo1.soft_delete()
+        changeset = ChangeSet.objects.get()
+        self.assertEquals(self.tmo1.pk, changeset.object_id)
+        records = dict((r.content_type.model_class(), r) for r in
+                       changeset.soft_delete_records.all())
+        self.assertEquals(set([TestModelOne, TestModelTwo, TestModelThrough]),
+                          set(records))
+        tmts = sorted(self.tmo1.tmts.all_with_deleted().values_list(
+            'pk', flat=True))
+        self.assertEquals(tmts, list(unpack_pks(
+            records[TestModelTwo].object_ids)))
+        self.assertEquals(tmts[0], records[TestModelTwo].min_pk)
+        self.assertEquals(tmts[-1], records[TestModelTwo].max_pk)
+
+    def test_undelete_child_restores_changeset(self):
+        earlier = self.tmo1.tmts.all()[0]
+        earlier.soft_delete()
+        self.tmo1.soft_delete()
+        self.assertEquals(2, ChangeSet.objects.count())
+        child = self.tmo1.tmts.all_with_deleted().exclude(pk=earlier.pk)[0]
+        child.undelete()
+        self.assertFalse(TestModelOne.objects.get(pk=self.tmo1.pk).deleted)
+        self.assertEquals(4, self.tmo1.tmts.count())
+        self.assertEquals(50, self.tmo1.left_side.count())
+        self.assertEquals(1, ChangeSet.objects.count())
+        earlier.undelete()
+        self.assertEquals(5, self.tmo1.tmts.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+        self.assertEquals(0, SoftDeleteRecord.objects.count())
+
+    def test_undelete_restores_with_one_update_per_model(self):
+        self.tmo1.soft_delete()
+        # save (2), changeset lookup (2), records (1), one UPDATE per
+        # model (3), changeset removal (3)
+        self.assertNumQueries(10, self.tmo1.undelete)
+        self.assertEquals(5, self.tmo1.tmts.count())
+
+    def test_soft_delete_twice_keeps_changeset(self):
+        self.tmo1.soft_delete()
+        TestModelOne.objects.get(pk=self.tmo1.pk).soft_delete()
+        TestModelOne.objects.all_with_deleted().soft_delete()
+        self.assertEquals(2, ChangeSet.objects.count())
+        self.tmo1.undelete()
+        self.assertEquals(5, self.tmo1.tmts.count())
+        self.assertEquals(1, ChangeSet.objects.count())
+
+    def test_soft_delete_again_records_related(self):
+        self.tmo1.soft_delete(do_related=False)
+        self.tmo1.soft_delete()
+        self.assertEquals(0, self.tmo1.tmts.count())
+        self.assertEquals(1, ChangeSet.objects.count())
+        self.tmo1.undelete()
+        self.assertEquals(5, self.tmo1.tmts.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+
+    def test_undelete_restores_every_changeset(self):
+        self.tmo1.soft_delete()
+        self.tmo1.undelete(do_related=False)
+        self.tmo1.soft_delete()
+        self.assertEquals(2, ChangeSet.objects.count())
+        self.tmo1.undelete()
+        self.assertEquals(5, self.tmo1.tmts.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+
+    def test_bulk_undelete_uses_changesets(self):
+        self.tmo2.tmts.all()[0].soft_delete()
+        TestModelOne.objects.all().soft_delete(bulk=True)
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertEquals(9, TestModelTwo.objects.count())
+        self.assertEquals(1, ChangeSet.objects.count())
+
+
+class IndexTest(TransactionTestCase):
+    def test_live_index_sql(self):
+        sql = live_index_sql(TestModelTwo, ('tmo',))
+        self.assertTrue(sql.startswith('CREATE INDEX'))
+        self.assertTrue(sql.endswith('("tmo_id") WHERE "deleted_at" IS NULL'))
+        self.assertTrue(live_index_sql(TestModelOne, ()).endswith(
+            '("deleted_at")'))
+
+    def test_declared_indexes_are_created(self):
+        name = live_index_name(TestModelTwo, ('tmo',), connection)
+        self.assertEquals([name], deleted_at_indexes(TestModelTwo))
+        self.assertEquals([], deleted_at_indexes(TestModelOne))
+
+    def test_report_command(self):
+        drop_live_index(TestModelTwo, ('tmo',))
+        out = StringIO()
+        call_command('softdelete_indexes', 'test_softdelete_app', stdout=out)
+        report = out.getvalue()
+        self.assertTrue('TestModelTwo: declared index on tmo is missing'
+                        in report)
+        self.assertTrue('TestModelOne: no index covers deleted_at, used by '
+                        'objects' in report)
+        out = StringIO()
+        call_command('softdelete_indexes', 'test_softdelete_app',
+                     create=True, stdout=out)
+        self.assertTrue('TestModelTwo: created' in out.getvalue())
+        self.assertEquals(1, len(deleted_at_indexes(TestModelTwo)))
+
+    def test_history_index(self):
+        self.assertTrue(history_index_sql(TestModelTwo).endswith(
+            '("deleted_at", "id") WHERE "deleted_at" IS NOT NULL'))
+        name = history_index_name(TestModelTwo, connection)
+        create_history_index(TestModelTwo)
+        create_history_index(TestModelTwo)
+        try:
+            self.assertTrue(name in deleted_at_indexes(TestModelTwo))
+        finally:
+            connection.cursor().execute('DROP INDEX "%s"' % name)
+
+
+class StreamingTest(NoReceiversTest):
+    def setUp(self):
+        super(StreamingTest, self).setUp()
+        self.chunk_size = getattr(settings, 'SOFTDELETE_CHUNK_SIZE', None)
+        settings.SOFTDELETE_CHUNK_SIZE = 7
+
+    def tearDown(self):
+        if self.chunk_size is None:
+            del settings.SOFTDELETE_CHUNK_SIZE
+        else:
+            settings.SOFTDELETE_CHUNK_SIZE = self.chunk_size
+        super(StreamingTest, self).tearDown()
+
+    def test_streamed_soft_delete(self):
+        self.tmo1.soft_delete(stream=True)
+        self.assertTrue(TestModelOne.objects.get(pk=self.tmo1.pk).deleted)
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertEquals(50, TestModelThrough.objects.count())
+        changeset = ChangeSet.objects.get()
+        for record in changeset.soft_delete_records.all():
+            self.assertTrue(len(list(unpack_pks(record.object_ids))) <= 7)
+        self.tmo1.undelete(stream=True)
+        self.assertEquals(10, TestModelTwo.objects.count())
+        self.assertEquals(100, TestModelThrough.objects.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+
+    def test_interrupted_soft_delete_resumes(self):
+        calls = []
+        def fail(sender, instance, **kwargs):
+            calls.append(instance)
+            if len(calls) == 20:
+                raise RuntimeError('worker died')
+        pre_soft_delete.connect(fail, sender=TestModelThrough)
+        self.assertRaises(RuntimeError, self.tmo1.soft_delete, stream=True)
+        pre_soft_delete.disconnect(fail, sender=TestModelThrough)
+        self.assertFalse(TestModelOne.objects.get(pk=self.tmo1.pk).deleted)
+        # two chunks of seven were committed before the failure
+        self.assertEquals(86, TestModelThrough.objects.count())
+        self.tmo1.soft_delete(stream=True)
+        self.assertEquals(50, TestModelThrough.objects.count())
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertEquals(1, ChangeSet.objects.count())
+        self.tmo1.undelete()
+        self.assertEquals(100, TestModelThrough.objects.count())
+        self.assertEquals(10, TestModelTwo.objects.count())
+
+    def test_streamed_queryset(self):
+        TestModelOne.objects.all().soft_delete(bulk=True, stream=True)
+        self.assertEquals(0, TestModelOne.objects.count())
+        self.assertEquals(0, TestModelThrough.objects.count())
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True,
+                                                         stream=True)
+        self.assertEquals(2, TestModelOne.objects.count())
+        self.assertEquals(100, TestModelThrough.objects.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+
+
+class BackgroundCascadeTest(NoReceiversTest):
+    def setUp(self):
+        super(BackgroundCascadeTest, self).setUp()
+        self.executor = getattr(settings, 'SOFTDELETE_CASCADE_EXECUTOR', None)
+        settings.SOFTDELETE_CASCADE_EXECUTOR = \
+            'softdelete.executors.DatabaseExecutor'
+
+    def tearDown(self):
+        if self.executor is None:
+            del settings.SOFTDELETE_CASCADE_EXECUTOR
+        else:
+            settings.SOFTDELETE_CASCADE_EXECUTOR = self.executor
+        super(BackgroundCascadeTest, self).tearDown()
+
+    def drain(self):
+        call_command('softdelete_worker', once=True, verbosity=0)
+
+    def test_soft_delete_in_background(self):
+        self.tmo1.soft_delete(background=True)
+        self.assertTrue(TestModelOne.objects.get(pk=self.tmo1.pk).deleted)
+        self.assertEquals(10, TestModelTwo.objects.count())
+        changeset = ChangeSet.objects.get()
+        self.assertEquals(CascadeJob.PENDING,
+                          CascadeJob.objects.status(changeset.pk))
+        self.drain()
+        self.assertEquals(CascadeJob.DONE,
+                          CascadeJob.objects.status(changeset.pk))
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertEquals(50, TestModelThrough.objects.count())
+        self.tmo1.undelete(background=True)
+        self.assertEquals(2, TestModelOne.objects.count())
+        self.drain()
+        self.assertEquals(10, TestModelTwo.objects.count())
+        self.assertEquals(CascadeJob.DONE,
+                          CascadeJob.objects.status(changeset.pk))
+        self.assertEquals(0, ChangeSet.objects.count())
+
+    def test_queryset_in_background(self):
+        settings.SOFTDELETE_CASCADE_EXECUTOR = \
+            'softdelete.executors.SynchronousExecutor'
+        TestModelOne.objects.all().soft_delete(bulk=True, background=True)
+        self.assertEquals(0, TestModelTwo.objects.count())
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True,
+                                                         background=True)
+        self.assertEquals(10, TestModelTwo.objects.count())
+        self.assertEquals(100, TestModelThrough.objects.count())
+        self.assertEquals(0, CascadeJob.objects.exclude(
+            status=CascadeJob.DONE).count())
+
+    def test_failed_job_is_recorded(self):
+        def fail(sender, instance, **kwargs):
+            raise RuntimeError('cascade failed')
+        pre_soft_delete.connect(fail, sender=TestModelTwo)
+        try:
+            self.tmo1.soft_delete(background=True)
+            self.drain()
+        finally:
+            pre_soft_delete.disconnect(fail, sender=TestModelTwo)
+        job = CascadeJob.objects.get()
+        self.assertEquals(CascadeJob.FAILED, job.status)
+        self.assertTrue('cascade failed' in job.error)
+        call_command('softdelete_worker', once=True, retry=True, verbosity=0)
+        self.assertEquals(CascadeJob.DONE, CascadeJob.objects.get().status)
+        self.assertEquals(5, TestModelTwo.objects.count())
+
+
+class BulkSignalTest(NoReceiversTest):
+    def setUp(self):
+        super(BulkSignalTest, self).setUp()
+        self.sent = []
+
+    def receive(self, signal, sender, **kwargs):
+        if 'pks' in kwargs:
+            self.sent.append((signal, sender, sorted(kwargs['pks'])))
+        else:
+            self.sent.append((signal, sender, kwargs['instance'].pk))
+
+    def test_bulk_signals(self):
+        for signal in (post_bulk_soft_delete, post_soft_delete):
+            signal.connect(self.receive)
+        tmts = sorted(self.tmo1.tmts.values_list('pk', flat=True))
+        TestModelOne.objects.filter(pk=self.tmo1.pk).soft_delete(bulk=True)
+        sent = dict((sender, pks) for signal, sender, pks in self.sent)
+        self.assertEquals(3, len(self.sent))
+        self.assertEquals([self.tmo1.pk], sent[TestModelOne])
+        self.assertEquals(tmts, sent[TestModelTwo])
+        self.assertEquals(50, len(sent[TestModelThrough]))
+
+    def test_instance_signals_are_opt_in(self):
+        post_bulk_undelete.connect(self.receive)
+        post_undelete.connect(self.receive)
+        TestModelOne.objects.all().soft_delete(bulk=True)
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True,
+                                                         send_signals=True)
+        self.assertEquals(112 + 3, len(self.sent))
+        self.sent = []
+        TestModelOne.objects.all().soft_delete(bulk=True)
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertEquals(3, len(self.sent))
+        self.assertTrue(all(signal is post_bulk_undelete
+                            for signal, sender, pks in self.sent))
+
+    def test_pre_bulk_signals_of_leaf_models(self):
+        pre_bulk_soft_delete.connect(self.receive)
+        pre_bulk_undelete.connect(self.receive)
+        settings.SOFTDELETE_CHANGESETS = False
+        try:
+            self.tmo1.tmts.all().soft_delete(bulk=True)
+        finally:
+            del settings.SOFTDELETE_CHANGESETS
+        TestModelTwo.objects.soft_deleted_set().undelete(bulk=True)
+        tmts = sorted(self.tmo1.tmts.values_list('pk', flat=True))
+        self.assertEquals([(pre_bulk_soft_delete, TestModelTwo, tmts),
+                           (pre_bulk_undelete, TestModelTwo, tmts)],
+                          self.sent)
+
+
+class TargetedUpdateTest(NoReceiversTest):
+    def test_soft_delete_keeps_concurrent_edits(self):
+        TestModelOne.objects.filter(pk=self.tmo1.pk).update(extra_bool=False)
+        self.tmo1.soft_delete()
+        tmo1 = TestModelOne.objects.get(pk=self.tmo1.pk)
+        self.assertTrue(tmo1.deleted)
+        self.assertFalse(tmo1.extra_bool)
+        TestModelOne.objects.filter(pk=self.tmo1.pk).update(extra_bool=True)
+        self.tmo1.undelete()
+        tmo1 = TestModelOne.objects.get(pk=self.tmo1.pk)
+        self.assertFalse(tmo1.deleted)
+        self.assertTrue(tmo1.extra_bool)
+
+    def test_save_cascades_only_on_change(self):
+        self.tmo1.deleted = False
+        self.assertNumQueries(2, self.tmo1.save)
+        self.tmo1.deleted = True
+        self.tmo1.save()
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.tmo1.deleted = True
+        self.assertNumQueries(2, self.tmo1.save)
+        self.tmo1.deleted = False
+        self.tmo1.save()
+        self.assertEquals(10, TestModelTwo.objects.count())
+
+
+class BenchmarkTest(TestCase):
+    def test_benchmark(self):
+        benchmark = Benchmark(depth=2, fan_out=3)
+        results = benchmark.run()
+        self.assertEquals(list(SCENARIOS), [r.scenario for r in results])
+        for result in results:
+            self.assertEquals(1 + 3 + 3 + 3 + 9, result.rows)
+        self.assertEquals([], benchmark.check(results))
+        results[0].queries = 100
+        self.assertEquals(1, len(benchmark.check(results)))
+        self.assertEquals(0, TestModelTree.objects.all_with_deleted().count())
+
+
+collected = []
+
+
+def collect(operation):
+    collected.append(operation)
+
+
+class InstrumentationTest(NoReceiversTest):
+    def setUp(self):
+        super(InstrumentationTest, self).setUp()
+        self.operations = []
+        del collected[:]
+
+    def receive(self, sender, operation, **kwargs):
+        self.operations.append(operation)
+
+    def test_operation_is_measured(self):
+        soft_delete_measured.connect(self.receive)
+        self.tmo1.soft_delete()
+        operation, = self.operations
+        self.assertEquals('soft_delete', operation.name)
+        self.assertEquals(TestModelOne, operation.model)
+        self.assertEquals({TestModelOne: 1, TestModelTwo: 5,
+                           TestModelThrough: 50}, operation.rows)
+        self.assertEquals(1, operation.depth)
+        self.assertTrue(operation.seconds >= 0)
+
+    def test_queries_are_counted_at_the_cursor(self):
+        soft_delete_measured.connect(self.receive)
+        calls = [(10, self.tmo1.soft_delete),
+                 (10, self.tmo1.undelete),
+                 (11, lambda: TestModelOne.objects.all().soft_delete(
+                     bulk=True))]
+        for queries, call in calls:
+            self.assertNumQueries(queries, call)
+            self.assertEquals(queries, self.operations[-1].queries)
+
+    def test_nested_operations_are_added_up(self):
+        soft_delete_measured.connect(self.receive)
+        TestModelOne.objects.all().soft_delete()
+        operation, = self.operations
+        self.assertEquals('queryset_soft_delete', operation.name)
+        self.assertEquals(112, operation.total_rows())
+        self.tmo1.undelete()
+        self.assertEquals('undelete', self.operations[-1].name)
+        self.assertEquals(56, self.operations[-1].total_rows())
+
+    def test_collector(self):
+        settings.SOFTDELETE_COLLECTOR = 'softdelete.tests.test_sd.collect'
+        try:
+            TestModelOne.objects.all().soft_delete(bulk=True, stream=True)
+        finally:
+            del settings.SOFTDELETE_COLLECTOR
+        operation, = collected
+        self.assertEquals(112, operation.total_rows())
+        self.assertEquals(1, operation.depth)
+        TestModelOne.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertEquals(1, len(collected))
+
+
+class AdminBulkActionTest(NoReceiversTest):
+    def setUp(self):
+        super(AdminBulkActionTest, self).setUp()
+        self.model_admin = admin.site._registry[TestModelOne]
+        self.user.is_superuser = True
+
+    def request(self, **data):
+        data[helpers.ACTION_CHECKBOX_NAME] = [self.tmo1.pk]
+        request = RequestFactory().post('/', data)
+        request.user = self.user
+        request._messages = CookieStorage(request)
+        return request
+
+    def queryset(self, request):
+        return self.model_admin.queryset(request).filter(pk=self.tmo1.pk)
+
+    def test_confirmation_counts_rows(self):
+        request = self.request(action='delete_selected')
+        response = self.model_admin.delete_selected(request,
+                                                    self.queryset(request))
+        self.assertContains(response, 'Test model twos: 5')
+        self.assertContains(response, 'Test model throughs: 50')
+        self.assertNotContains(response, 'Test model trees')
+        self.assertEquals(10, TestModelTwo.objects.count())
+
+    def test_soft_delete_and_undelete(self):
+        request = self.request(action='delete_selected', post='yes')
+        self.assertEquals(None, self.model_admin.delete_selected(
+            request, self.queryset(request)))
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertEquals(2, TestModelOne.objects.all_with_deleted().count())
+        request = self.request(action='soft_undelete')
+        response = self.model_admin.soft_undelete(request,
+                                                  self.queryset(request))
+        self.assertContains(response, 'Test model ones: 1')
+        request = self.request(action='soft_undelete', post='yes')
+        self.model_admin.soft_undelete(request, self.queryset(request))
+        self.assertEquals(10, TestModelTwo.objects.count())
+
+    def test_undelete_confirmation_counts_changesets(self):
+        self.tmo1.tmts.all()[0].soft_delete()
+        self.tmo1.soft_delete()
+        request = self.request(action='soft_undelete')
+        response = self.model_admin.soft_undelete(request,
+                                                  self.queryset(request))
+        self.assertContains(response, 'Test model ones: 1')
+        self.assertContains(response, 'Test model twos: 4')
+        request = self.request(action='soft_undelete', post='yes')
+        self.model_admin.soft_undelete(request, self.queryset(request))
+        self.assertEquals(9, TestModelTwo.objects.count())
+
+    def test_large_selection_in_background(self):
+        settings.SOFTDELETE_ADMIN_BACKGROUND_THRESHOLD = 0
+        settings.SOFTDELETE_CASCADE_EXECUTOR = \
+            'softdelete.executors.DatabaseExecutor'
+        try:
+            request = self.request(action='delete_selected', post='yes')
+            self.model_admin.delete_selected(request, self.queryset(request))
+        finally:
+            del settings.SOFTDELETE_ADMIN_BACKGROUND_THRESHOLD
+            del settings.SOFTDELETE_CASCADE_EXECUTOR
+        self.assertEquals(1, TestModelOne.objects.count())
+        self.assertEquals(10, TestModelTwo.objects.count())
+        self.assertEquals(CascadeJob.PENDING, CascadeJob.objects.get().status)
+
+
+class AdminChangeListTest(BaseTest):
+    def changelist(self, **params):
+        model_admin = admin.site._registry[TestModelTwo]
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return model_admin.get_changelist(request)(
+            request, TestModelTwo, model_admin.list_display,
+            model_admin.list_display_links, model_admin.list_filter,
+            model_admin.date_hierarchy, model_admin.search_fields,
+            model_admin.list_select_related, model_admin.list_per_page,
+            model_admin.list_editable, model_admin)
+
+    def test_deleted_filter(self):
+        self.tmo1.soft_delete()
+        self.assertEquals(10, self.changelist().result_count)
+        self.assertEquals(5, self.changelist(
+            deleted_at__isnull='True').result_count)
+        cl = self.changelist(deleted_at__isnull='False')
+        self.assertEquals(5, cl.result_count)
+        self.assertEquals(10, cl.full_result_count)
+        spec, = cl.filter_specs
+        self.assertTrue(isinstance(spec, DeletedFilterSpec))
+        self.assertEquals(['Deleted'], [c['display'] for c in
+                                        spec.choices(cl) if c['selected']])
+
+    def test_approximate_count_paginator(self):
+        model_admin = admin.site._registry[TestModelTwo]
+        model_admin.paginator = ApproximateCountPaginator
+        try:
+            cl = self.changelist(deleted_at__isnull='True')
+        finally:
+            del model_admin.paginator
+        self.assertEquals(10, cl.result_count)
+        self.assertEquals(10, cl.full_result_count)
+        self.assertEquals(None, estimate_count(TestModelTwo.objects.all()))
+
+
+class TestModelTwoInline(SoftDeleteObjectInline):
+    model = TestModelTwo
+
+
+class InlineTest(BaseTest):
+    def formset(self, **options):
+        inline = TestModelTwoInline(TestModelOne, admin.site)
+        inline.__dict__.update(options)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        formset = inline.get_formset(request, self.tmo1)(
+            instance=self.tmo1, queryset=inline.queryset(request))
+        fieldsets = [(None, {'fields': list(formset.form.base_fields)})]
+        return formset, helpers.InlineAdminFormSet(inline, formset, fieldsets)
+
+    def test_deleted_children_are_counted(self):
+        for tmt in self.tmo1.tmts.all()[:2]:
+            tmt.soft_delete()
+        formset, inline_formset = self.formset()
+        self.assertEquals(3, len(formset.get_queryset()))
+        self.assertNumQueries(1, formset.deleted_count)
+        self.assertEquals(2, formset.deleted_count())
+        self.assertFalse(formset.truncated())
+        html = render_to_string(inline_formset.opts.template,
+                                {'inline_admin_formset': inline_formset})
+        self.assertTrue('2 deleted test model twos not shown' in html)
+        formset, inline_formset = self.formset(show_deleted=True)
+        self.assertEquals(5, len(formset.get_queryset()))
+        self.assertEquals(0, formset.deleted_count())
+
+    def test_max_rows(self):
+        formset, inline_formset = self.formset(max_rows=2)
+        self.assertEquals(2, len(formset.forms) - formset.extra)
+        self.assertTrue(formset.truncated())
+        html = render_to_string(inline_formset.opts.template,
+                                {'inline_admin_formset': inline_formset})
+        self.assertTrue('Only the first 2 test model twos are shown' in html)
+
+    def test_max_rows_not_reached(self):
+        self.tmo1.tmts.all()[0].soft_delete()
+        formset, inline_formset = self.formset(max_rows=4)
+        self.assertEquals(4, len(formset.forms) - formset.extra)
+        self.assertNumQueries(0, formset.truncated)
+        self.assertFalse(formset.truncated())
+        html = render_to_string(inline_formset.opts.template,
+                                {'inline_admin_formset': inline_formset})
+        self.assertFalse('Only the first' in html)
+
+
+class RecordingRouter(object):
+    def __init__(self):
+        self.routed = []
+
+    def db_for_write(self, model, **hints):
+        self.routed.append(model)
+        return 'default'
+
+
+class NoOpinionRouter(object):
+    def db_for_write(self, model, **hints):
+        return None
+
+
+class RouterTest(NoReceiversTest):
+    def setUp(self):
+        super(RouterTest, self).setUp()
+        self.router = RecordingRouter()
+        self.routers = router.routers
+        router.routers = [self.router]
+
+    def tearDown(self):
+        router.routers = self.routers
+        super(RouterTest, self).tearDown()
+
+    def test_related_models_are_routed(self):
+        self.assertEquals(['default'],
+                          cascade_aliases(TestModelOne, 'default'))
+        self.tmo1.soft_delete()
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.assertTrue(TestModelTwo in self.router.routed)
+        self.assertTrue(TestModelThrough in self.router.routed)
+        del self.router.routed[:]
+        TestModelOne.objects.all().soft_delete(bulk=True)
+        self.assertTrue(TestModelOne in self.router.routed)
+        self.tmo1.undelete()
+        self.assertEquals(5, TestModelTwo.objects.count())
+
+    def test_without_routers_the_cascade_stays_on_its_database(self):
+        router.routers = []
+        cascade = SoftDeleteCascade(using='other')
+        self.assertEquals('other', cascade.db_for(TestModelTwo))
+        self.assertEquals(['other'], cascade_aliases(TestModelOne, 'other'))
+
+    def test_routers_without_opinion_keep_the_cascade_database(self):
+        router.routers = [NoOpinionRouter(), object()]
+        cascade = SoftDeleteCascade(using='other')
+        self.assertEquals('other', cascade.db_for(TestModelTwo))
+        self.assertEquals(['other'], cascade_aliases(TestModelOne, 'other'))
+        router.routers.append(self.router)
+        self.assertEquals('default', cascade.db_for(TestModelThrough))
+
+
+class RecordingParallelCascade(ParallelCascade):
+    def can_run_concurrently(self, aliases):
+        return True
+
+    def _update(self, model, pks, value):
+        self.updated.append((model, len(pks),
+                             threading.current_thread().name))
+
+
+class ParallelCascadeTest(NoReceiversTest):
+    def test_sqlite_runs_serially(self):
+        cascade = ParallelCascade(using='default')
+        self.assertFalse(cascade.can_run_concurrently(['default']))
+        self.tmo1.soft_delete(parallel=True)
+        self.assertEquals(5, TestModelTwo.objects.count())
+        self.tmo1.undelete(parallel=True)
+        TestModelOne.objects.all().soft_delete(bulk=True, parallel=True)
+        self.assertEquals(0, TestModelThrough.objects.count())
+
+    def test_branches_are_updated_by_workers(self):
+        cascade = RecordingParallelCascade(using='default', workers=2)
+        cascade.updated = []
+        cascade.soft_delete(TestModelOne, [self.tmo1.pk])
+        self.assertTrue(cascade.concurrent)
+        self.assertEquals(set([(TestModelThrough, 50), (TestModelTwo, 5)]),
+                          set([(m, n) for m, n, t in cascade.updated]))
+        main = threading.current_thread().name
+        self.assertFalse(main in [t for m, n, t in cascade.updated])
+
+
+class RelatedTest(NoReceiversTest):
+    def setUp(self):
+        super(RelatedTest, self).setUp()
+        self.tmo1.tmts.all()[0].soft_delete()
+        TestModelThrough.objects.filter(tmo1=self.tmo1)[0].soft_delete()
+
+    def test_prefetch_live(self):
+        tmos = TestModelOne.objects.all().prefetch_live(
+            'tmts', 'testmodelthree_set')
+        with self.assertNumQueries(4):
+            tmos = list(tmos)
+        with self.assertNumQueries(0):
+            counts = dict((tmo.pk, (len(tmo.tmts.all()),
+                                    tmo.testmodelthree_set.count()))
+                          for tmo in tmos)
+        self.assertEquals((4, 49), counts[self.tmo1.pk])
+        self.assertEquals((5, 50), counts[self.tmo2.pk])
+
+    def test_prefetch_with_deleted(self):
+        tmo = TestModelOne.objects.filter(pk=self.tmo1.pk).prefetch_with_deleted(
+            'tmts', 'testmodelthree_set')[0]
+        with self.assertNumQueries(0):
+            self.assertEquals(5, len(tmo.tmts.all()))
+            self.assertEquals(50, len(tmo.testmodelthree_set.all()))
+        self.assertEquals(4, tmo.tmts.filter(extra_int__gte=0).count())
+
+    def test_related_managers_skip_deleted_links(self):
+        self.assertEquals(49, self.tmo1.testmodelthree_set.count())
+        self.assertEquals(4, self.tmo1.tmts.count())
+        self.assertEquals(1, self.tmo1.tmts.soft_deleted_set().count())
+        self.assertEquals(5, self.tmo1.tmts.all_with_deleted().count())
+
+    def test_select_related_live(self):
+        self.tmo1.soft_delete(do_related=False)
+        tmts = TestModelTwo.objects.all().select_related_live('tmo')
+        with self.assertNumQueries(1):
+            self.assertEquals(set([self.tmo2.pk]),
+                              set([tmt.tmo.pk for tmt in tmts]))
+
+
+class GetOrCreateTest(NoReceiversTest):
+    def setUp(self):
+        super(GetOrCreateTest, self).setUp()
+        self.tmt = TestModelTwo.objects.get(tmo=self.tmo1, extra_int=1)
+        self.tmt.soft_delete()
+
+    def test_deleted_match_is_returned_as_is(self):
+        tmt, created = TestModelTwo.objects.get_or_create(
+            tmo=self.tmo1, extra_int=1)
+        self.assertFalse(created)
+        self.assertEquals(self.tmt.pk, tmt.pk)
+        self.assertTrue(tmt.deleted)
+
+    def test_resurrect(self):
+        tmt, created = TestModelTwo.objects.get_or_create(
+            tmo=self.tmo1, extra_int=1, resurrect=True)
+        self.assertFalse(created)
+        self.assertEquals(self.tmt.pk, tmt.pk)
+        self.assertFalse(tmt.deleted)
+        self.assertEquals(5, self.tmo1.tmts.count())
+        tmt, created = TestModelTwo.objects.get_or_create(
+            tmo_id=self.tmo1.pk, extra_int=11, resurrect=True)
+        self.assertTrue(created)
+
+    def test_update_or_create(self):
+        tmt, created = TestModelTwo.objects.update_or_create(
+            tmo=self.tmo1, extra_int=1, defaults={'extra_int': 21})
+        self.assertFalse(created)
+        self.assertEquals(21, tmt.extra_int)
+        self.assertTrue(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        tmt, created = TestModelTwo.objects.update_or_create(
+            tmo=self.tmo1, extra_int=21, defaults={'extra_int': 1},
+            resurrect=True)
+        self.assertFalse(created)
+        self.assertFalse(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        self.assertEquals(1, TestModelTwo.objects.get(pk=self.tmt.pk).extra_int)
+        tmt, created = TestModelTwo.objects.update_or_create(
+            tmo=self.tmo1, extra_int=31, defaults={'extra_int': 32})
+        self.assertTrue(created)
+        self.assertEquals(32, tmt.extra_int)
+
+
+class PurgeTest(NoReceiversTest):
+    MODELS = (TestModelOne, TestModelTwo, TestModelThrough, TestModelTree)
+
+    def setUp(self):
+        super(PurgeTest, self).setUp()
+        for model in self.MODELS:
+            model.soft_delete_retention = timedelta(days=30)
+        self.purge = Purge(now=datetime.now() + timedelta(days=31),
+                           chunk_size=4)
+
+    def tearDown(self):
+        for model in self.MODELS:
+            del model.soft_delete_retention
+        super(PurgeTest, self).tearDown()
+
+    def test_children_first(self):
+        order = purge_order([TestModelOne, TestModelTree, TestModelTwo])
+        self.assertTrue(order.index(TestModelOne) > order.index(TestModelTwo))
+        self.assertTrue(order.index(TestModelOne) > order.index(TestModelTree))
+
+    def test_purge(self):
+        self.tmo1.soft_delete()
+        self.assertEquals([], [r.deleted for r in Purge().run(
+            purge_order(self.MODELS)) if r.deleted])
+        dry_run = Purge(now=self.purge.now, dry_run=True)
+        self.assertEquals(50, dry_run.purge(TestModelThrough).deleted)
+        results = self.purge.run(purge_order(self.MODELS))
+        self.assertEquals(set([(TestModelOne, 1), (TestModelTwo, 5),
+                               (TestModelThrough, 50)]),
+                          set([(r.model, r.deleted) for r in results
+                               if r.deleted]))
+        self.assertEquals(1, TestModelOne.objects.all_with_deleted().count())
+        self.assertEquals(5, TestModelTwo.objects.all_with_deleted().count())
+        self.assertEquals(0, SoftDeleteRecord.objects.count())
+        self.assertEquals(0, ChangeSet.objects.count())
+
+    def test_referenced_rows_are_kept(self):
+        self.tmo1.soft_delete(do_related=False)
+        result = self.purge.purge(TestModelOne)
+        self.assertEquals((0, 1), (result.deleted, result.skipped))
+        self.assertEquals(2, TestModelOne.objects.all_with_deleted().count())
+
+    def test_self_referencing_rows(self):
+        root = TestModelTree.objects.create()
+        level = [root]
+        for depth in range(3):
+            level = [TestModelTree.objects.create(parent=parent)
+                     for parent in level for x in range(2)]
+        root.soft_delete()
+        result = self.purge.purge(TestModelTree)
+        self.assertEquals(15, result.deleted)
+        self.assertEquals(0, TestModelTree.objects.all_with_deleted().count())
+
+    def test_command(self):
+        self.tmo1.soft_delete()
+        out = StringIO()
+        call_command('softdelete_purge', 'test_softdelete_app.TestModelTwo',
+                     dry_run=True, stdout=out)
+        self.assertEquals('test_softdelete_app.TestModelTwo: 0 expired, '
+                          '0 skipped, 0 records\n', out.getvalue())
+
+
+class ArchiveTest(NoReceiversTest):
+    def setUp(self):
+        super(ArchiveTest, self).setUp()
+        self.tmo3 = TestModelThree.objects.create()
+        for x in range(4):
+            TestModelArchived.objects.create(tmo3=self.tmo3, extra_int=x)
+        self.archived = TestModelArchived.objects.get(extra_int=0)
+
+    def rows(self, table):
+        cursor = connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM %s' % table)
+        return cursor.fetchone()[0]
+
+    def test_soft_delete_moves_rows(self):
+        self.archived.soft_delete()
+        self.assertEquals(3, self.rows(TestModelArchived._meta.db_table))
+        self.assertEquals(1, self.rows(archive_table(TestModelArchived)))
+        self.assertEquals(3, TestModelArchived.objects.count())
+        self.assertEquals(1, TestModelArchived.objects.soft_deleted_set().count())
+        self.assertEquals(4, TestModelArchived.objects.all_with_deleted().count())
+        archived = TestModelArchived.objects.get(pk=self.archived.pk)
+        self.assertTrue(archived.deleted)
+        self.assertEquals(self.tmo3, archived.tmo3)
+        archived.extra_int = 10
+        archived.save()
+        self.assertEquals(10, TestModelArchived.objects.soft_deleted_set(
+            ).get(pk=self.archived.pk).extra_int)
+        archived.undelete()
+        self.assertEquals(4, self.rows(TestModelArchived._meta.db_table))
+        self.assertEquals(0, self.rows(archive_table(TestModelArchived)))
+        self.assertEquals(10, TestModelArchived.objects.get(
+            pk=self.archived.pk).extra_int)
+
+    def test_cascade(self):
+        self.tmo3.soft_delete()
+        self.assertEquals(0, self.rows(TestModelArchived._meta.db_table))
+        self.assertEquals(4, self.tmo3.archived.soft_deleted_set().count())
+        self.tmo3.undelete()
+        self.assertEquals(4, self.tmo3.archived.count())
+        TestModelArchived.objects.filter(extra_int__gte=2).soft_delete(
+            bulk=True)
+        self.assertEquals(2, self.rows(archive_table(TestModelArchived)))
+        TestModelArchived.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertEquals(4, self.rows(TestModelArchived._meta.db_table))
+
+    def test_archive_keeps_column_types(self):
+        self.archived.soft_delete()
+        deleted = TestModelArchived.objects.soft_deleted_set()[0]
+        self.assertTrue(isinstance(deleted.deleted_at, datetime))
+        self.assertTrue(isinstance(TestModelArchived.objects.get(
+            pk=self.archived.pk).deleted_at, datetime))
+
+    def test_get_or_create_and_update_or_create(self):
+        self.archived.soft_delete()
+        obj, created = TestModelArchived.objects.get_or_create(
+            extra_int=0, resurrect=True)
+        self.assertFalse(created or obj.deleted)
+        self.assertEquals(4, self.rows(TestModelArchived._meta.db_table))
+        self.assertEquals(0, self.rows(archive_table(TestModelArchived)))
+        obj, created = TestModelArchived.objects.update_or_create(
+            extra_int=1, defaults={'extra_int': 6})
+        self.assertEquals(6, TestModelArchived.objects.get(pk=obj.pk).extra_int)
+        obj.soft_delete()
+        TestModelArchived.objects.update_or_create(
+            extra_int=6, defaults={'extra_int': 7})
+        self.assertEquals(7, TestModelArchived.objects.soft_deleted_set().get(
+            pk=obj.pk).extra_int)
+        TestModelArchived.objects.update_or_create(
+            extra_int=7, defaults={'extra_int': 8}, resurrect=True)
+        self.assertEquals(8, TestModelArchived.objects.get(pk=obj.pk).extra_int)
+        self.assertEquals(0, self.rows(archive_table(TestModelArchived)))
+
+    def test_keys_of_archived_rows_are_not_reused(self):
+        last = TestModelArchived.objects.order_by('-pk')[0]
+        last.soft_delete()
+        created = TestModelArchived.objects.create(tmo3=self.tmo3,
+                                                   extra_int=9)
+        self.assertTrue(created.pk > last.pk)
+        self.assertTrue(TestModelArchived.objects.get(pk=last.pk).deleted)
+        created.soft_delete()
+        self.assertEquals(2, TestModelArchived.objects.soft_deleted_set(
+            ).count())
+
+    def test_hard_delete(self):
+        deleted = []
+        receiver = lambda sender, instance, **kwargs: deleted.append(
+            instance.pk)
+        post_delete.connect(receiver, sender=TestModelArchived)
+        try:
+            self.archived.soft_delete()
+            TestModelArchived.objects.get(pk=self.archived.pk).delete()
+            self.assertEquals([self.archived.pk], deleted)
+            self.assertEquals(3, TestModelArchived.objects.all_with_deleted(
+                ).count())
+            TestModelArchived.objects.filter(extra_int=1).soft_delete(
+                bulk=True)
+            TestModelArchived.objects.soft_deleted_set().delete()
+            self.assertEquals(0, self.rows(archive_table(TestModelArchived)))
+            TestModelArchived.objects.filter(extra_int=2).soft_delete(
+                bulk=True)
+            TestModelArchived.objects.all_with_deleted().delete()
+        finally:
+            post_delete.disconnect(receiver, sender=TestModelArchived)
+        self.assertEquals(0, TestModelArchived.objects.all_with_deleted(
+            ).count())
+        self.assertEquals(4, len(deleted))
+
+    def test_referenced_models_cannot_be_archived(self):
+        self.assertRaises(ImproperlyConfigured, check_archive, TestModelOne)
+
+
+class PlanTest(NoReceiversTest):
+    def test_object_plan(self):
+        with self.assertNumQueries(4):
+            plan = self.tmo1.soft_delete_plan()
+        self.assertEquals({TestModelOne: 1, TestModelTwo: 5,
+                           TestModelThrough: 50}, plan.rows())
+        self.assertEquals((56, 1, 'sync', None),
+                          (plan.total_rows(), plan.depth(),
+                           plan.suggested_mode(), plan.cost))
+        self.assertEquals(3, self.tmo1.soft_delete_plan(
+            do_related=False).queries)
+        with self.assertNumQueries(plan.queries):
+            self.tmo1.soft_delete()
+        self.assertEquals(0, self.tmo1.soft_delete_plan().total_rows())
+
+    def test_queryset_plan(self):
+        qs = TestModelOne.objects.all()
+        plan = qs.soft_delete_plan()
+        self.assertEquals(112, plan.total_rows())
+        with self.assertNumQueries(plan.queries):
+            qs.soft_delete(bulk=True)
+        plan = TestModelTwo.objects.all().soft_delete_plan(do_related=False)
+        self.assertEquals({}, plan.rows())
+
+
+class CycleTest(NoReceiversTest):
+    def setUp(self):
+        super(CycleTest, self).setUp()
+        self.first = TestModelTree.objects.create(tmo=self.tmo1)
+        self.second = TestModelTree.objects.create(parent=self.first)
+        self.first.parent = self.second
+        self.first.save()
+
+    def test_cascade_plan(self):
+        plan = cascade_plan(TestModelOne)
+        self.assertEquals(set([TestModelTree]), plan.cycles())
+        self.assertEquals(set([TestModelTree]), plan.shared_models())
+        self.assertEquals(set(), cascade_plan(TestModelTwo).cycles())
+
+    def test_cyclic_rows(self):
+        self.tmo1.soft_delete()
+        self.assertEquals(0, TestModelTree.objects.count())
+        self.tmo1.undelete()
+        self.assertEquals(2, TestModelTree.objects.count())
+        self.tmo1.soft_delete(stream=True)
+        self.assertEquals(0, TestModelTree.objects.count())
+        TestModelOne.objects.all_with_deleted().undelete(bulk=True,
+                                                         stream=True)
+        self.assertEquals(2, TestModelTree.objects.count())
+
+    def test_deep_chain_is_streamed(self):
+        parent = self.second
+        for x in range(1200):
+            parent = TestModelTree.objects.create(parent=parent)
+        self.tmo1.soft_delete(stream=True)
+        self.assertEquals(0, TestModelTree.objects.count())
+        self.tmo1.undelete(stream=True)
+        self.assertEquals(1202, TestModelTree.objects.count())
+
+    def test_rows_are_collected_once(self):
+        cascade = SoftDeleteCascade()
+        cascade.soft_delete(TestModelTree, [self.first.pk])
+        self.assertEquals(set([self.first.pk, self.second.pk]),
+                          cascade.visited[TestModelTree])
+        self.assertEquals([self.first], list(TestModelTree.objects.all()))
+
+    def test_plan_stops(self):
+        plan = self.first.soft_delete_plan()
+        self.assertFalse(plan.exact)
+        self.assertEquals(set([TestModelTree]), plan.cycles)
+        self.assertEquals(9, len(plan.levels))
+
+
+class CacheTest(NoReceiversTest):
+    def setUp(self):
+        super(CacheTest, self).setUp()
+        TestModelTwo.soft_delete_cache = True
+        reset_soft_delete_cache()
+        self.tmt = self.tmo1.tmts.all()[0]
+
+    def tearDown(self):
+        del TestModelTwo.soft_delete_cache
+        reset_soft_delete_cache()
+        super(CacheTest, self).tearDown()
+
+    def test_lookups_are_cached(self):
+        TestModelTwo.objects.get(pk=self.tmt.pk)
+        with self.assertNumQueries(0):
+            tmt = TestModelTwo.objects.get(id=str(self.tmt.pk))
+        self.assertEquals(self.tmt, tmt)
+        with self.assertNumQueries(1):
+            TestModelTwo.objects.get(pk=self.tmt.pk, extra_int=tmt.extra_int)
+
+    def test_invalidation(self):
+        TestModelTwo.objects.get(pk=self.tmt.pk)
+        self.tmt.soft_delete()
+        self.assertTrue(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        self.tmt.undelete()
+        self.assertFalse(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        self.tmo1.soft_delete()
+        self.assertTrue(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        self.tmo1.undelete()
+        self.assertFalse(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        TestModelOne.objects.all().soft_delete(bulk=True, do_related=True)
+        self.assertTrue(TestModelTwo.objects.get(pk=self.tmt.pk).deleted)
+        self.tmt.extra_int = 42
+        self.tmt.save()
+        self.assertEquals(42, TestModelTwo.objects.get(pk=self.tmt.pk).extra_int)
+
+    def test_shared_backend(self):
+        cache = SoftDeleteCache(backend=get_cache('locmem://'))
+        cache.set(TestModelTwo, self.tmt)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEquals(self.tmt, cache.get(TestModelTwo, self.tmt.pk))
+        cache.delete(TestModelTwo, [self.tmt.pk])
+        self.assertEquals(None, cache.get(TestModelTwo, self.tmt.pk))
+
+    def test_lru(self):
+        cache = SoftDeleteCache(size=2)
+        tmts = list(TestModelTwo.objects.all()[:3])
+        for tmt in tmts:
+            cache.set(TestModelTwo, tmt)
+        self.assertEquals(None, cache.get(TestModelTwo, tmts[0].pk))
+        self.assertEquals(tmts[2], cache.get(TestModelTwo, tmts[2].pk))
+
+
+class CounterTest(BaseTest):
+    def setUp(self):
+        super(CounterTest, self).setUp()
+        TestModelTwo.soft_delete_counters = ('tmo',)
+        call_command('softdelete_counters', 'test_softdelete_app',
+                     verbosity=0)
+        self.tmt = self.tmo1.tmts.all()[0]
+
+    def tearDown(self):
+        del TestModelTwo.soft_delete_counters
+        super(CounterTest, self).tearDown()
+
+    def assertCounts(self, total, tmo1):
+        self.assertEquals(total, TestModelTwo.objects.counts())
+        self.assertEquals(tmo1, self.tmo1.tmts.counts())
+        self.assertEquals(total, reconcile(TestModelTwo, 'default'))
+
+    def test_reconcile(self):
+        self.assertCounts((10, 0), (5, 0))
+        ContentType.objects.get_for_model(TestModelTwo)
+        with self.assertNumQueries(1):
+            self.assertEquals((5, 0), self.tmo2.tmts.counts())
+        self.tmo2.soft_delete()
+        self.assertEquals((1, 1), TestModelOne.objects.counts())
+
+    def test_soft_delete_and_undelete(self):
+        self.tmt.soft_delete()
+        self.tmt.soft_delete()
+        self.assertCounts((9, 1), (4, 1))
+        self.tmt.undelete()
+        self.assertCounts((10, 0), (5, 0))
+        self.tmo1.soft_delete()
+        self.assertCounts((5, 5), (0, 5))
+        self.tmo1.undelete()
+        self.assertCounts((10, 0), (5, 0))
+        TestModelTwo.objects.filter(tmo=self.tmo2).soft_delete(bulk=True)
+        self.assertCounts((5, 5), (5, 0))
+        TestModelTwo.objects.soft_deleted_set().undelete(bulk=True)
+        self.assertCounts((10, 0), (5, 0))
+
+    def test_deleted_checkbox(self):
+        tmt = TestModelTwo.objects.get(pk=self.tmt.pk)
+        tmt.deleted = True
+        tmt.save()
+        self.assertCounts((9, 1), (4, 1))
+        self.assertTrue(TestModelTwo.objects.get(pk=tmt.pk).deleted)
+        tmt.deleted = False
+        tmt.extra_int = 42
+        tmt.save()
+        self.assertCounts((10, 0), (5, 0))
+        self.assertEquals(42, TestModelTwo.objects.get(pk=tmt.pk).extra_int)
+
+    def test_create_delete_and_purge(self):
+        TestModelTwo.objects.create(extra_int=10, tmo=self.tmo1)
+        self.assertCounts((11, 0), (6, 0))
+        self.tmt.delete()
+        self.assertCounts((10, 0), (5, 0))
+        TestModelTwo.objects.update_or_create(
+            extra_int=3, defaults={'deleted_at': datetime.utcnow()})
+        self.assertCounts((9, 1), (4, 1))
+        TestModelTwo.soft_delete_retention = timedelta(days=1)
+        try:
+            Purge(now=datetime.today() + timedelta(days=2)).purge(
+                TestModelTwo)
+        finally:
+            del TestModelTwo.soft_delete_retention
+        self.assertCounts((9, 0), (4, 0))
+
+
+class TimeTravelTest(BaseTest):
+    def setUp(self):
+        super(TimeTravelTest, self).setUp()
+        self.t0 = datetime(2012, 1, 1)
+        self.tmts = list(TestModelTwo.objects.order_by('pk'))
+        for i, tmt in enumerate(self.tmts[:6]):
+            TestModelTwo.objects.filter(pk=tmt.pk).update(
+                deleted_at=self.t0 + timedelta(days=i // 2))
+
+    def test_alive_at(self):
+        self.assertEquals(10, TestModelTwo.objects.alive_at(
+            self.t0 - timedelta(days=1)).count())
+        self.assertEquals(6, TestModelTwo.objects.alive_at(
+            self.t0 + timedelta(days=1)).count())
+        self.assertEquals(4, TestModelTwo.objects.alive_at(
+            self.t0 + timedelta(days=3)).count())
+
+    def test_deleted_between(self):
+        self.assertEquals(self.tmts[2:4], list(
+            TestModelTwo.objects.deleted_between(
+                self.t0 + timedelta(days=1), self.t0 + timedelta(days=2))))
+        self.assertEquals(self.tmts[2:6], list(
+            TestModelTwo.objects.deleted_between(
+                self.t0 + timedelta(hours=1))))
+        self.assertEquals(3, self.tmo1.tmts.deleted_between(self.t0).count())
+
+    def test_deleted_since_pages_by_keyset(self):
+        seen, since, pk = [], self.t0, None
+        while True:
+            page = list(TestModelTwo.objects.deleted_since(since, pk)[:4])
+            if not page:
+                break
+            seen.extend(page)
+            since, pk = page[-1].deleted_at, page[-1].pk
+        self.assertEquals(self.tmts[:6], seen)
+        self.tmts[0].undelete()
+        self.tmts[0].soft_delete()
+        self.assertEquals([self.tmts[0]], list(
+            TestModelTwo.objects.deleted_since(since, pk)))